@@ -0,0 +1,29 @@
+// Выбор игрока в браузере: подсветка аватара и сброс повторным нажатием
+// без запроса к серверу. Имена игроков и стили аватаров - в players-store.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    players: {
+        select: function () {
+            const args = Array.prototype.slice.call(arguments);
+            const store = args[args.length - 1];
+            const currentSelection = args[args.length - 2];
+            const triggered = dash_clientside.callback_context.triggered;
+
+            let selectedPlayer = null;
+            if (triggered.length && triggered[0].value) {
+                const clickedId = triggered[0].prop_id.split('.')[0];
+                const playerIndex = parseInt(clickedId.split('-').pop(), 10);
+                selectedPlayer = store.names[playerIndex];
+
+                // Сброс при повторном нажатии
+                if (currentSelection === selectedPlayer) {
+                    selectedPlayer = null;
+                }
+            }
+
+            const styles = store.names.map(function (name) {
+                return name === selectedPlayer ? store.selected_style : store.default_style;
+            });
+            return [selectedPlayer].concat(styles);
+        }
+    }
+});
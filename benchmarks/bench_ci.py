@@ -0,0 +1,60 @@
+"""
+Сравнение построчного calcilate_Ci и векторного calculate_ci на синтетических
+таблицах первых отстрелов.
+
+    python benchmarks/bench_ci.py [--rows 1000 10000 100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prep import calcilate_Ci, calculate_ci  # noqa: E402
+
+
+def make_firstshots(n_rows, seed=42):
+    """Случайные отстрелы в духе df_firstshots, включая пустые строки (промахи)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'game_date': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 730, n_rows), unit='D'),
+        'total_kill_in_series': rng.integers(1, 6, n_rows).astype(float),
+        'maf_in_best': rng.integers(0, 4, n_rows).astype(float),
+        'who_win': pd.Series(rng.integers(0, 2, n_rows), dtype=object),
+    })
+    missing = rng.random(n_rows) < 0.05
+    df.loc[missing, ['game_date', 'total_kill_in_series', 'maf_in_best', 'who_win']] = np.nan
+    return df
+
+
+def timeit(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'apply, s':>10} {'vector, s':>10} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = make_firstshots(n_rows)
+        # Построчная версия медленная, её достаточно замерить один раз
+        apply_time, expected = timeit(lambda: df.apply(calcilate_Ci, axis=1), 1)
+        vector_time, result = timeit(lambda: calculate_ci(df), args.repeat)
+        pd.testing.assert_series_equal(result, expected, check_exact=True)
+        print(f'{n_rows:>10} {apply_time:>10.4f} {vector_time:>10.4f} {apply_time / vector_time:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Размер фигур в ответах колбэков до и после figures.compact_figure.
+
+"до" - фигура как есть через стандартный json, "после" - компактный словарь
+через JSON-движок plotly по умолчанию (orjson, если установлен). Для каждого
+построителя - сумма по типовым состояниям (все игроки и топ-10).
+
+    python benchmarks/bench_figures.py
+"""
+import gzip
+import importlib.util
+import os
+import sys
+import time
+
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard as d  # noqa: E402
+from figures import compact_figure, figure_size  # noqa: E402
+from prep import create_circular_layout, create_heatmap, create_sankey, create_shooting_target, \
+    create_timeline  # noqa: E402
+from summaries import ALL_PLAYERS, shot_distribution  # noqa: E402
+
+
+def builders():
+    """(построитель, список фигур для типовых состояний)."""
+    players = [None] + d.top10_players
+    # Отстрелы по кольцам как в update_players_dashboard
+    shots = {p: shot_distribution(d.firstshot_summary.get(p or ALL_PLAYERS)) for p in players}
+    return [
+        ('create_timeline', [create_timeline(d.top_players, p) for p in players]),
+        ('create_shooting_target', [create_shooting_target(shots[p]) for p in players]),
+        ('create_heatmap', [create_heatmap(d.pair_index.query(), role, 50, 4) for role in ('Мирные', 'Мафия')]),
+        ('create_sankey', [create_sankey(d.pair_index.query(p)) for p in d.top10_players]),
+        ('create_circular_layout', [create_circular_layout(d.box_cube.box_stats(p), ['win_rate', 'shots'])
+                                    for p in players]),
+    ]
+
+
+def gzip_size(figures, engine=None):
+    """Суммарный размер JSON фигур после gzip."""
+    return sum(len(gzip.compress(pio.to_json(fig, validate=False, engine=engine).encode('utf-8'))) for fig in figures)
+
+
+def main():
+    orjson = importlib.util.find_spec('orjson') is not None
+    print(f"json engine after: {'orjson' if orjson else 'json'}")
+    print(f"{'builder':<24} {'figs':>4} {'before, B':>10} {'after, B':>9} {'gzip before':>12} {'gzip after':>11} "
+          f"{'encode before, ms':>18} {'encode after, ms':>17}")
+
+    totals = [0, 0, 0, 0]
+    for name, figures in builders():
+        start = time.perf_counter()
+        raw_before = sum(figure_size(fig, engine='json') for fig in figures)
+        before_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compact = [compact_figure(fig) for fig in figures]
+        raw_after = sum(figure_size(fig) for fig in compact)
+        after_time = time.perf_counter() - start
+
+        gz_before, gz_after = gzip_size(figures, engine='json'), gzip_size(compact)
+        for i, value in enumerate((raw_before, raw_after, gz_before, gz_after)):
+            totals[i] += value
+        print(f'{name:<24} {len(figures):>4} {raw_before:>10} {raw_after:>9} {gz_before:>12} {gz_after:>11} '
+              f'{before_time * 1000:>18.1f} {after_time * 1000:>17.1f}')
+
+    print(f"{'total':<24} {'':>4} {totals[0]:>10} {totals[1]:>9} {totals[2]:>12} {totals[3]:>11}")
+
+
+if __name__ == '__main__':
+    main()
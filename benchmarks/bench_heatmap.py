@@ -0,0 +1,90 @@
+"""
+Тепловая карта пар: заполнение матриц построчно через .loc (прежний вариант
+create_heatmap) против prep.pair_matrices на синтетической статистике пар.
+
+    python benchmarks/bench_heatmap.py [--players 10 100 500] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prep import create_heatmap, pair_matrices  # noqa: E402
+
+
+def make_pairs(n_players, seed=42):
+    """Статистика всех пар n_players игроков в формате PairStatsIndex.query()."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f'Игрок {i}' for i in range(n_players)], dtype=object)
+    p1, p2 = np.triu_indices(n_players, k=1)
+    total = rng.integers(1, 30, len(p1))
+    wins = rng.integers(0, total + 1)
+    win_rate = (wins / total * 100).round(2)
+
+    # Обе стороны пары, как в grouped_stats
+    return pd.DataFrame({
+        'player1_name': np.concatenate([names[p1], names[p2]]),
+        'player2_name': np.concatenate([names[p2], names[p1]]),
+        'role_group': 'Мирные',
+        'total_games': np.concatenate([total, total]),
+        'wins_together': np.concatenate([wins, wins]),
+        'win_rate': np.concatenate([win_rate, win_rate]),
+    })
+
+
+def loc_matrices(df):
+    """Прежнее заполнение матриц: iterrows и запись .loc в object-таблицы."""
+    players = sorted(set(df['player1_name'].unique()) | set(df['player2_name'].unique()))
+    winrate_matrix = pd.DataFrame(None, index=players, columns=players)
+    games_matrix = pd.DataFrame(None, index=players, columns=players)
+    for _, row in df.iterrows():
+        p1, p2 = row['player1_name'], row['player2_name']
+        winrate_matrix.loc[p1, p2] = row['win_rate']
+        winrate_matrix.loc[p2, p1] = row['win_rate']
+        games_matrix.loc[p1, p2] = row['total_games']
+        games_matrix.loc[p2, p1] = row['total_games']
+    return players, winrate_matrix, games_matrix
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--players', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-loc-above', type=int, default=100,
+                        help='не запускать построчный вариант для большего числа игроков')
+    args = parser.parse_args()
+
+    print(f"{'players':>8} {'pairs':>8} {'.loc, s':>9} {'matrix, s':>10} {'figure, s':>10}")
+    for n_players in args.players:
+        df = make_pairs(n_players)
+        matrix_time, (players, winrate, games) = best_time(lambda: pair_matrices(df), args.repeat)
+        figure_time, _ = best_time(lambda: create_heatmap(df), args.repeat)
+
+        if n_players <= args.skip_loc_above:
+            loc_time, expected = best_time(lambda: loc_matrices(df), 1)
+            assert players == expected[0]
+            np.testing.assert_array_equal(winrate, expected[1].to_numpy(dtype=float))
+            np.testing.assert_array_equal(games, expected[2].to_numpy(dtype=float))
+            loc = f'{loc_time:>9.3f}'
+        else:
+            loc = f"{'-':>9}"
+
+        print(f'{n_players:>8} {len(df):>8} {loc} {matrix_time:>10.4f} {figure_time:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
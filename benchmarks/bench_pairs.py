@@ -0,0 +1,81 @@
+"""
+Масштабирование статистики пар: analyze_pairs_optimized (self-merge) против
+analyze_pairs_sparse (разреженные матрицы) на синтетических играх.
+
+    python benchmarks/bench_pairs.py [--games 1000 10000 50000] [--players 100 1000 5000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prep_data import analyze_pairs_optimized, analyze_pairs_sparse  # noqa: E402
+
+# Раздача карт за столом: 6 мирных, 2 мафии, дон, шериф
+ROLES = np.array([1, 1, 1, 1, 1, 1, 2, 2, 3, 4])
+
+
+def make_games(n_games, n_players, seed=42):
+    """Игры по 10 случайных игроков из пула n_players в формате df_games."""
+    rng = np.random.default_rng(seed)
+    seats = np.stack([rng.choice(n_players, 10, replace=False) for _ in range(n_games)])
+    roles = np.stack([rng.permutation(ROLES) for _ in range(n_games)])
+    who_win = rng.integers(0, 2, n_games)
+
+    player_id = seats.ravel()
+    role_id = roles.ravel()
+    game_who_win = np.repeat(who_win, 10)
+    df = pd.DataFrame({
+        'game_id': np.repeat(np.arange(n_games), 10),
+        'player_id': player_id,
+        'player_name': pd.Series(player_id).map('Игрок {}'.format).to_numpy(dtype=object),
+        'role_id': role_id,
+    })
+    df['win_condition'] = np.where(
+        (np.isin(role_id, [1, 4]) & (game_who_win == 0)) | (np.isin(role_id, [2, 3]) & (game_who_win == 1)), 1, 0)
+    return df
+
+
+def measure(func, df):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    parser.add_argument('--players', type=int, nargs='+', default=[100, 1_000, 5_000])
+    parser.add_argument('--skip-merge-above', type=int, default=50_000,
+                        help='не запускать merge-версию для большего числа игр')
+    args = parser.parse_args()
+
+    print(f"{'games':>8} {'players':>8} {'merge, s':>9} {'merge, MB':>10} {'sparse, s':>10} {'sparse, MB':>11}")
+    for n_games in args.games:
+        for n_players in args.players:
+            df = make_games(n_games, n_players)
+            sparse_time, sparse_peak, result = measure(analyze_pairs_sparse, df)
+
+            if n_games <= args.skip_merge_above:
+                merge_time, merge_peak, expected = measure(analyze_pairs_optimized, df)
+                pd.testing.assert_frame_equal(result[0], expected[0], check_exact=True)
+                pd.testing.assert_frame_equal(result[1], expected[1], check_exact=True)
+                merge = f'{merge_time:>9.3f} {merge_peak / 2 ** 20:>10.1f}'
+            else:
+                merge = f"{'-':>9} {'-':>10}"
+
+            print(f'{n_games:>8} {n_players:>8} {merge} {sparse_time:>10.3f} {sparse_peak / 2 ** 20:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+Замеры производительности дашборда: подготовка данных, статистика пар, итоги
+серий, построители фигур и колбэки (вызываются напрямую, без кэша) - время и
+пиковая память (tracemalloc) на синтетических данных разного масштаба
+(benchmarks/generate_data.py).
+
+Каждый масштаб считается в отдельном процессе: dashboard загружает данные при
+импорте, а пиковая память одного масштаба не влияет на другой. Результаты
+пишутся в JSON и сравниваются с сохранённой базой; при регрессии времени или
+памяти сверх допуска код выхода 1.
+
+    python benchmarks/bench_suite.py --save-baseline           # записать базу
+    python benchmarks/bench_suite.py                           # сравнить с базой
+    python benchmarks/bench_suite.py --scales x1 x10 x100 -o /tmp/results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+from generate_data import SCALES, generate  # noqa: E402
+
+RESULTS_PATH = os.path.join(here, 'results.json')
+BASELINE_PATH = os.path.join(here, 'baseline.json')
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'kc-bench')
+
+# Игрок для состояний "выбран игрок" (есть в любой сгенерированной выгрузке)
+PLAYER = 'KED'
+
+# Допуски сравнения с базой: относительный и абсолютный (шум коротких замеров).
+# Сравнивается минимальное время - оно меньше медианы зависит от фоновой нагрузки
+TIME_TOLERANCE = 0.25
+TIME_NOISE_MS = 1.0
+MEMORY_TOLERANCE = 0.20
+MEMORY_NOISE_MB = 1.0
+
+
+def measure(func, repeat, budget):
+    """
+    Время func() - не больше repeat запусков, пока суммарное время меньше
+    budget секунд (минимум один), затем отдельный запуск под tracemalloc.
+    """
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'runs': len(times),
+        'min_ms': round(min(times) * 1000, 3),
+        'median_ms': round(float(np.median(times)) * 1000, 3),
+        'peak_mb': round(peak / 2 ** 20, 3),
+    }
+
+
+def cases(data_path):
+    """(имя, функция без аргументов) для всех замеров на выгрузке data_path."""
+    # Дашборд читает выгрузку при импорте: без снапшота, прогрева и кэша колбэков
+    os.environ.update(KC_DATA_PATH=data_path, KC_SNAPSHOT='0', KC_CACHE_WARMUP='0', KC_CALLBACK_CACHE_SIZE='0')
+
+    import pandas as pd
+
+    import dashboard as d
+    from ingest import read_full_data
+    from prep import create_circular_layout, create_heatmap, create_sankey, create_shooting_target, \
+        create_timeline, generate_quadrant_plot, get_full_data, get_role
+    from prep_data import analyze_pairs_optimized, analyze_pairs_sparse
+    from series import build_series_results
+    from summaries import ALL_PLAYERS, ROLES, shot_distribution
+
+    with open(data_path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    # Данные квадрантов как в update_players_dashboard
+    role_summary = d.player_summary[PLAYER][1]
+    role_stats = pd.DataFrame({'role_id': role_summary['role_id'], 'total_games': role_summary['games'],
+                               'win_games': role_summary['wins'], 'dops': role_summary['dops'].round(2),
+                               'winrate': role_summary['winrate']}).merge(get_role(), on='role_id', how='left')
+
+    all_pairs, player_pairs = d.pair_index.query(), d.pair_index.query(PLAYER)
+    box_stats = d.box_cube.box_stats(None, ROLES)
+    shots = shot_distribution(d.firstshot_summary.get(ALL_PLAYERS))
+
+    return [
+        ('get_full_data', lambda: get_full_data(data)),
+        ('ingest.read_full_data', lambda: read_full_data(data_path)),
+        ('analyze_pairs_optimized', lambda: analyze_pairs_optimized(d.df_games)),
+        ('analyze_pairs_sparse', lambda: analyze_pairs_sparse(d.df_games)),
+        ('build_series_results', lambda: build_series_results(d.df_games)),
+        ('create_timeline', lambda: create_timeline(d.top_players)),
+        ('create_heatmap', lambda: create_heatmap(all_pairs, 'Мирные', 50, 4)),
+        ('create_sankey', lambda: create_sankey(player_pairs)),
+        ('create_circular_layout', lambda: create_circular_layout(box_stats, ['win_rate', 'shots'])),
+        ('create_shooting_target', lambda: create_shooting_target(shots)),
+        ('generate_quadrant_plot', lambda: generate_quadrant_plot(role_stats)),
+        ('update_timeline', lambda: d.update_timeline(PLAYER)),
+        ('update_players_dashboard', lambda: d.update_players_dashboard(None)),
+        ('update_players_dashboard[player]', lambda: d.update_players_dashboard(PLAYER)),
+        ('update_figure', lambda: d.update_figure(['win_rate'], [], None, 'Мирные', 4)),
+        ('update_figure[player]', lambda: d.update_figure(['win_rate'], [], PLAYER, 'Мирные', 4)),
+    ]
+
+
+def run_worker(data_path, output, repeat, budget):
+    """Замеры на одной выгрузке (в отдельном процессе), результат - JSON в output."""
+    results = {}
+    for name, func in cases(data_path):
+        results[name] = measure(func, repeat, budget)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+
+
+def data_file(scale, seed, data_dir):
+    """Путь к выгрузке масштаба scale; генерируется, если её ещё нет."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'{scale}-seed{seed}.json')
+    if not os.path.exists(path):
+        print(f'generating {path}', flush=True)
+        generate(path, scale, seed)
+    return path
+
+
+def run_scale(scale, args):
+    data_path = data_file(scale, args.seed, args.data_dir)
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', data_path, output,
+                        '--repeat', str(args.repeat), '--budget', str(args.budget)],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def environment():
+    import dash
+    import pandas as pd
+    import plotly
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'packages': {'pandas': pd.__version__, 'numpy': np.__version__, 'plotly': plotly.__version__,
+                     'dash': dash.__version__},
+    }
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Печатает отношение к базе по каждому замеру и возвращает список регрессий
+    (масштаб, замер, метрика, было, стало).
+    """
+    regressions = []
+    print(f"\n{'scale':<6} {'benchmark':<34} {'base min, ms':>12} {'now min, ms':>12} {'x':>6} "
+          f"{'base, MB':>9} {'now, MB':>9} {'x':>6}")
+    for scale, scale_results in results['scales'].items():
+        base_results = baseline.get('scales', {}).get(scale, {}).get('benchmarks', {})
+        for name, now in scale_results['benchmarks'].items():
+            base = base_results.get(name)
+            if base is None:
+                continue
+            time_ratio = now['min_ms'] / max(base['min_ms'], 1e-9)
+            memory_ratio = now['peak_mb'] / max(base['peak_mb'], 1e-9)
+            marks = ''
+            if time_ratio > 1 + time_tolerance and now['min_ms'] - base['min_ms'] > TIME_NOISE_MS:
+                regressions.append((scale, name, 'min_ms', base['min_ms'], now['min_ms']))
+                marks += ' TIME'
+            if memory_ratio > 1 + memory_tolerance and now['peak_mb'] - base['peak_mb'] > MEMORY_NOISE_MB:
+                regressions.append((scale, name, 'peak_mb', base['peak_mb'], now['peak_mb']))
+                marks += ' MEMORY'
+            print(f"{scale:<6} {name:<34} {base['min_ms']:>12.1f} {now['min_ms']:>12.1f} {time_ratio:>6.2f} "
+                  f"{base['peak_mb']:>9.1f} {now['peak_mb']:>9.1f} {memory_ratio:>6.2f}{marks}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['x1', 'x10'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=7, help='максимум запусков на замер')
+    parser.add_argument('--budget', type=float, default=3.0, help='секунд на замер (не считая tracemalloc)')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='каталог сгенерированных выгрузок')
+    parser.add_argument('-o', '--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE, help='допуск по времени, доля')
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help='допуск по памяти, доля')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты как базу')
+    parser.add_argument('--worker', nargs=2, metavar=('DATA', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker, args.repeat, args.budget)
+        return
+
+    results = {**environment(), 'seed': args.seed, 'scales': {}}
+    for scale in args.scales:
+        print(f'[{scale}] {SCALES[scale]}', flush=True)
+        benchmarks = run_scale(scale, args)
+        results['scales'][scale] = {'params': SCALES[scale], 'benchmarks': benchmarks}
+        for name, result in benchmarks.items():
+            print(f"    {name:<34} {result['median_ms']:>10.1f} ms (min {result['min_ms']:.1f}, "
+                  f"{result['runs']} runs) {result['peak_mb']:>9.1f} MB", flush=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'results: {args.output}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'baseline saved: {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline} (use --save-baseline)')
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"baseline: {args.baseline} (commit {baseline.get('commit')}, {baseline.get('created')})")
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s):')
+        for scale, name, metric, base, now in regressions:
+            print(f'    {scale} {name} {metric}: {base} -> {now}')
+        sys.exit(1)
+    print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Синтетические выгрузки турниров в формате data/tstata_kc.json - для замеров
+подготовки данных, колбэков и нагрузочных тестов на сезонах больше нашего.
+
+Устройство как в реальной выгрузке:
+    - серия - клубный вечер по понедельникам, club_id у каждого вечера свой;
+      в один день может проходить несколько вечеров (--clubs), игрок за вечер
+      бывает только на одном из них;
+    - за вечер играют одни и те же 10 игроков, --games игр подряд, рассадка
+      и раздача карт (6 мирных, 2 мафии, дон, шериф) в каждой игре новые;
+    - у игроков есть сила и частота посещения: победа мафии зависит от
+      разницы сил команд (в среднем ~53%, как в реальных данных);
+    - первый отстрел - мирный или шериф, он отмечает 3 бокса в ЛХ, мафию
+      угадывает чаще случайного; 0.25 балла за 2 мафии в ЛХ, 0.5 - за 3;
+      бывают игры без первого отстрела и с пустым отстрелом.
+
+Игроки из top10_players дашборда всегда есть в пуле и ходят чаще остальных,
+поэтому дашборд запускается на сгенерированном файле без изменений:
+
+    python benchmarks/generate_data.py --scale x10 -o /tmp/kc_x10.json
+    KC_DATA_PATH=/tmp/kc_x10.json python dashboard.py
+
+Результат определяется seed и параметрами.
+"""
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+
+# Игроки из top10_players дашборда (для них есть фото в assets/foto)
+TOP_PLAYERS = ['Колобок', 'KED', 'Зверюга', 'Бывшая', 'Плесень', 'GOJO', 'Лупа', 'Дантист', 'Ирландец', 'Блудница']
+
+# Раздача карт за столом: 6 мирных, 2 мафии, дон, шериф
+ROLES = np.array([1, 1, 1, 1, 1, 1, 2, 2, 3, 4])
+TABLE_SIZE = len(ROLES)
+
+WINNER_NAMES = {0: 'Победа мирных', 1: 'Победа мафии'}
+
+# Лестница масштабов: x1 - размер реальной выгрузки (225 игр, 52 игрока)
+SCALES = {
+    'x1': {'dates': 45, 'clubs': 1, 'players': 52, 'games': 5},
+    'x10': {'dates': 90, 'clubs': 5, 'players': 260, 'games': 5},
+    'x100': {'dates': 180, 'clubs': 25, 'players': 1300, 'games': 5},
+}
+
+START_DATE = datetime.date(2024, 3, 25)
+
+# Доли и значения доп. баллов и штрафов, близкие к реальным
+DOP_SHARE = 0.37
+DOP_VALUES = ['0.10', '0.20', '0.30', '0.40', '0.50']
+DOP_WEIGHTS = [0.18, 0.37, 0.27, 0.14, 0.04]
+MINUS_SHARE = 0.02
+MINUS_VALUES = ['-0.30', '-0.40', '-0.50', '-1.00']
+MINUS_WEIGHTS = [0.07, 0.23, 0.58, 0.12]
+
+MAFIA_WIN_RATE = 0.53
+SKILL_EFFECT = 1.5
+# Доли игр без первого отстрела и с пустым отстрелом, и "чутьё" на мафию в ЛХ
+NO_FIRSTSHOT_SHARE = 0.04
+EMPTY_FIRSTSHOT_SHARE = 0.03
+MAFIA_PICK_WEIGHT = 1.3
+
+
+def make_players(n_players, rng):
+    """Пул игроков: (player_id, имя, сила, вес посещаемости)."""
+    if n_players < len(TOP_PLAYERS):
+        raise ValueError(f'players must be >= {len(TOP_PLAYERS)}')
+    names = TOP_PLAYERS + [f'Игрок {i}' for i in range(1, n_players - len(TOP_PLAYERS) + 1)]
+    ids = rng.permutation(np.arange(1, n_players + 1) * 3)
+    skill = rng.normal(0, 0.5, n_players)
+    attendance = rng.gamma(2.0, 1.0, n_players)
+    attendance[:len(TOP_PLAYERS)] = attendance.max() * 1.5
+    return ids, names, skill, attendance / attendance.sum()
+
+
+def _timestamp(date, minutes):
+    moment = datetime.datetime.combine(date, datetime.time(16, 0)) + datetime.timedelta(minutes=int(minutes))
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000000Z')
+
+
+def _score(value):
+    return f'{value:.2f}'
+
+
+def make_game(game_id, date, club_id, number, seats, players, ids, rng):
+    """
+    Одна игра в формате выгрузки.
+
+    :param seats: Позиции в пуле игроков 10 участников вечера.
+    :param players: Пул из make_players.
+    :param ids: Счётчики id записей {'gameplayer': ..., 'gamefirstshot': ...}.
+    """
+    player_ids, names, skill, _ = players
+    seats = rng.permutation(seats)
+    roles = rng.permutation(ROLES)
+    mafia = np.isin(roles, [2, 3])
+
+    # Победа мафии: логистическая модель от разницы средних сил команд
+    advantage = skill[seats[mafia]].mean() - skill[seats[~mafia]].mean()
+    logit = np.log(MAFIA_WIN_RATE / (1 - MAFIA_WIN_RATE)) + SKILL_EFFECT * advantage
+    who_win = int(rng.random() < 1 / (1 + np.exp(-logit)))
+    won = mafia if who_win == 1 else ~mafia
+
+    started = 60 * number + rng.integers(0, 10)
+    finished = started + rng.integers(30, 60)
+    created_at, updated_at = _timestamp(date, started), _timestamp(date, finished)
+
+    # Первый отстрел: мирный или шериф отмечает 3 бокса в ЛХ
+    best = np.zeros(TABLE_SIZE, dtype=int)
+    firstshot = None
+    draw = rng.random()
+    if draw >= NO_FIRSTSHOT_SHARE:
+        firstshot = {'id': ids['gamefirstshot'], 'game_id': game_id, 'player_id': None, 'boxNumber': None,
+                     'score': '0.00', 'created_at': updated_at, 'updated_at': updated_at}
+        ids['gamefirstshot'] += 1
+        if draw >= NO_FIRSTSHOT_SHARE + EMPTY_FIRSTSHOT_SHARE:
+            shot = rng.choice(np.flatnonzero(~mafia))
+            others = np.delete(np.arange(TABLE_SIZE), shot)
+            weights = np.where(mafia[others], MAFIA_PICK_WEIGHT, 1.0)
+            best[rng.choice(others, 3, replace=False, p=weights / weights.sum())] = 1
+            maf_in_best = int((best.astype(bool) & mafia).sum())
+            firstshot.update(player_id=int(player_ids[seats[shot]]), boxNumber=int(shot + 1),
+                             score={2: '0.25', 3: '0.50'}.get(maf_in_best, '0.00'))
+
+    dops = np.where(rng.random(TABLE_SIZE) < DOP_SHARE, rng.choice(DOP_VALUES, TABLE_SIZE, p=DOP_WEIGHTS), '0.00')
+    minus = np.where(rng.random(TABLE_SIZE) < MINUS_SHARE,
+                     rng.choice(MINUS_VALUES, TABLE_SIZE, p=MINUS_WEIGHTS), '0.00')
+
+    gameplayer = []
+    for box in range(TABLE_SIZE):
+        gameplayer.append({
+            'id': ids['gameplayer'], 'game_id': game_id, 'boxNumber': box + 1,
+            'player_id': int(player_ids[seats[box]]), 'role_id': int(roles[box]),
+            'score': _score(float(won[box])), 'score_dop': str(dops[box]), 'score_minus': str(minus[box]),
+            'best': int(best[box]), 'live': 0, 'warnings': 0, 'vote': 0,
+            'created_at': created_at, 'updated_at': updated_at, 'PlayerName': names[seats[box]],
+        })
+        ids['gameplayer'] += 1
+
+    return {
+        'id': game_id, 'club_id': club_id, 'date': date.isoformat(), 'table': 1, 'number': str(number),
+        'winner_id': who_win, 'user_id': 1, 'subscribe': None, 'coeff': '1.00', 'transa': 1, 'active_fase': 0,
+        'WinnerName': WINNER_NAMES[who_win], 'gameplayer': gameplayer, 'gamefirstshot': firstshot,
+    }
+
+
+def generate_games(dates=45, clubs=1, players=52, games=5, seed=42):
+    """
+    Генератор игр в формате выгрузки.
+
+    :param dates: Число игровых дней (понедельники подряд с START_DATE).
+    :param clubs: Число клубных вечеров (серий) в один день.
+    :param players: Размер пула игроков, не меньше 10 * clubs.
+    :param games: Число игр за вечер.
+    """
+    if players < TABLE_SIZE * clubs:
+        raise ValueError(f'players must be >= {TABLE_SIZE * clubs} for {clubs} clubs')
+
+    rng = np.random.default_rng(seed)
+    pool = make_players(players, rng)
+    attendance = pool[3]
+    ids = {'gameplayer': 100_000, 'gamefirstshot': 20_000}
+    game_id = 10_000
+    club_id = 100
+
+    for day in range(dates):
+        date = START_DATE + datetime.timedelta(weeks=day)
+        # Участники всех вечеров дня без повторов
+        attendees = rng.choice(players, TABLE_SIZE * clubs, replace=False, p=attendance)
+        for club in range(clubs):
+            seats = attendees[club * TABLE_SIZE:(club + 1) * TABLE_SIZE]
+            for number in range(1, games + 1):
+                yield make_game(game_id, date, club_id, number, seats, pool, ids, rng)
+                game_id += 1
+            club_id += 1
+
+
+def write_games(path, games):
+    """Записывает игры JSON-массивом по одной, не собирая список в памяти. Возвращает число игр."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for game in games:
+            f.write(',\n' if count else '\n')
+            json.dump(game, f, ensure_ascii=False)
+            count += 1
+        f.write('\n]\n')
+    return count
+
+
+def generate(path, scale=None, seed=42, **params):
+    """
+    Пишет синтетическую выгрузку в path: параметры масштаба scale из SCALES,
+    переопределённые params (dates, clubs, players, games).
+    """
+    params = {**SCALES.get(scale, {}), **{k: v for k, v in params.items() if v is not None}}
+    return write_games(path, generate_games(seed=seed, **params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-o', '--output', required=True, help='путь к JSON-файлу')
+    parser.add_argument('--scale', choices=list(SCALES), default='x1')
+    parser.add_argument('--dates', type=int, help='игровых дней')
+    parser.add_argument('--clubs', type=int, help='клубных вечеров в день')
+    parser.add_argument('--players', type=int, help='игроков в пуле')
+    parser.add_argument('--games', type=int, help='игр за вечер')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    count = generate(args.output, args.scale, args.seed,
+                     dates=args.dates, clubs=args.clubs, players=args.players, games=args.games)
+    print(f'{args.output}: {count} games, {os.path.getsize(args.output) / 2 ** 20:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
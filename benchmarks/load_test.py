@@ -0,0 +1,333 @@
+"""
+Нагрузочный тест /_dash-update-component: параллельные "пользователи" щёлкают
+игроков, роли, метрики и настройки тепловой карты, сервер отвечает на те же
+запросы, что отправил бы браузер.
+
+Тела запросов строятся по /_dash-dependencies и /_dash-layout запущенного
+дашборда: серверные колбэки (клиентские, как выбор игрока, браузер выполняет
+сам), их входы и допустимые значения элементов управления из layout. Выбор
+игрока моделируется изменением player-content.children - результатом
+клиентского колбэка players.select.
+
+Каждый пользователь сначала открывает страницу (колбэки без
+prevent_initial_call), затем до конца теста меняет один элемент управления и
+отправляет запросы всех колбэков, зависящих от него. Отчёт по каждому колбэку:
+число запросов и ошибок, перцентили и гистограмма задержек, размер ответов.
+
+Сервер запускается локально (gunicorn dashboard:server, без gunicorn -
+встроенный сервер Flask) или задаётся --url:
+
+    python benchmarks/load_test.py --users 20 --duration 30
+    python benchmarks/load_test.py --data /tmp/kc_x10.json --no-cache --workers 4
+    python benchmarks/load_test.py --url http://127.0.0.1:8054/ --json /tmp/load.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Результат клиентского выбора игрока и хранилище с именами игроков
+PLAYER_PROP = 'player-content.children'
+PLAYERS_STORE = 'players-store'
+
+# Доля действий "выбрать игрока" среди всех действий пользователя
+PLAYER_ACTION_SHARE = 0.4
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_BOUNDS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+SERVER_START_TIMEOUT = 300
+
+
+def prop_id(item):
+    return f"{item['id']}.{item['property']}"
+
+
+def callback_label(dependency):
+    """Имя колбэка в отчёте: первый выход и число остальных."""
+    outputs = dependency['output'].strip('.').split('...')
+    return outputs[0] + (f' (+{len(outputs) - 1})' if len(outputs) > 1 else '')
+
+
+def layout_components(node, found=None):
+    """Словарь id -> компонент (type и props) из JSON /_dash-layout."""
+    found = {} if found is None else found
+    if isinstance(node, list):
+        for child in node:
+            layout_components(child, found)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if isinstance(props.get('id'), str):
+            found[props['id']] = node
+        layout_components(props.get('children'), found)
+    return found
+
+
+def value_domain(component, prop):
+    """
+    Генератор случайных значений свойства prop элемента управления:
+    подмножество опций для Checklist, одна опция для RadioItems/Dropdown,
+    число от 0 до удвоенного начального для числового Input.
+    """
+    props = component['props']
+    initial = props.get(prop)
+    options = [o['value'] if isinstance(o, dict) else o for o in props.get('options') or []]
+
+    if options and isinstance(initial, list):
+        return lambda rng: rng.sample(options, rng.randint(0, len(options)))
+    if options:
+        return lambda rng: rng.choice(options)
+    if props.get('type') == 'number' and isinstance(initial, (int, float)):
+        upper = max(int(initial) * 2, 1)
+        return lambda rng: rng.randint(0, upper)
+    return lambda rng: initial
+
+
+class Scenario:
+    """Серверные колбэки дашборда, начальное состояние и генераторы значений входов."""
+
+    def __init__(self, dependencies, layout):
+        components = layout_components(layout)
+        self.callbacks = [dep for dep in dependencies if not dep.get('clientside_function')]
+
+        self.initial = {}
+        self.domains = {}
+        for dep in self.callbacks:
+            for item in dep['inputs'] + dep['state']:
+                key = prop_id(item)
+                if key == PLAYER_PROP:
+                    names = components[PLAYERS_STORE]['props']['data']['names']
+                    self.initial[key] = None
+                    self.domains[key] = lambda rng, names=names: rng.choice([None] + names)
+                elif item['id'] in components:
+                    self.initial[key] = components[item['id']]['props'].get(item['property'])
+                    self.domains[key] = value_domain(components[item['id']], item['property'])
+
+        self.controls = sorted(key for key in self.domains if key != PLAYER_PROP)
+
+    def body(self, dependency, state, changed):
+        """Тело запроса /_dash-update-component в формате dash-renderer."""
+        outputs = [dict(zip(('id', 'property'), out.rsplit('.', 1)))
+                   for out in dependency['output'].strip('.').split('...')]
+        multi = dependency['output'].startswith('..')
+        return {
+            'output': dependency['output'],
+            'outputs': outputs if multi else outputs[0],
+            'inputs': [{**item, 'value': state.get(prop_id(item))} for item in dependency['inputs']],
+            'state': [{**item, 'value': state.get(prop_id(item))} for item in dependency['state']],
+            'changedPropIds': [key for key in changed
+                               if any(prop_id(item) == key for item in dependency['inputs'])],
+        }
+
+    def page_load(self):
+        """Запросы при открытии страницы: (колбэк, тело)."""
+        return [(dep, self.body(dep, self.initial, [])) for dep in self.callbacks
+                if not dep.get('prevent_initial_call')]
+
+    def action(self, state, rng):
+        """Меняет один элемент управления в state и возвращает запросы зависящих от него колбэков."""
+        key = PLAYER_PROP if rng.random() < PLAYER_ACTION_SHARE or not self.controls else rng.choice(self.controls)
+        state[key] = self.domains[key](rng)
+        return [(dep, self.body(dep, state, [key])) for dep in self.callbacks
+                if any(prop_id(item) == key for item in dep['inputs'])]
+
+
+class Results:
+    """Задержки, размеры ответов и ошибки по колбэкам (потокобезопасно)."""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.size = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def add(self, label, latency, size=None, error=None):
+        with self._lock:
+            self.latency[label].append(latency)
+            if error is None:
+                self.size[label].append(size)
+            else:
+                self.errors[label][error] += 1
+
+    def summary(self, elapsed):
+        report = {'elapsed_s': round(elapsed, 3), 'callbacks': {}}
+        total = 0
+        for label in sorted(self.latency):
+            latency = np.array(self.latency[label]) * 1000
+            sizes = np.array(self.size[label] or [0])
+            errors = sum(self.errors[label].values())
+            total += len(latency)
+            counts = np.histogram(latency, [0] + HISTOGRAM_BOUNDS + [np.inf])[0]
+            report['callbacks'][label] = {
+                'requests': len(latency),
+                'errors': errors,
+                'error_rate': round(errors / len(latency), 4),
+                'error_kinds': dict(self.errors[label]),
+                'p50_ms': round(float(np.percentile(latency, 50)), 2),
+                'p90_ms': round(float(np.percentile(latency, 90)), 2),
+                'p99_ms': round(float(np.percentile(latency, 99)), 2),
+                'max_ms': round(float(latency.max()), 2),
+                'mean_bytes': int(sizes.mean()),
+                'max_bytes': int(sizes.max()),
+                'histogram_ms': {f'<{bound}': int(n) for bound, n in zip(HISTOGRAM_BOUNDS + ['inf'], counts)},
+            }
+        report['requests'] = total
+        report['throughput_rps'] = round(total / max(elapsed, 1e-9), 2)
+        return report
+
+
+def post(session, url, label, body, results, timeout):
+    start = time.perf_counter()
+    try:
+        response = session.post(url, json=body, timeout=timeout)
+    except requests.RequestException as e:
+        results.add(label, time.perf_counter() - start, error=type(e).__name__)
+        return
+    latency = time.perf_counter() - start
+    if response.status_code == 200:
+        results.add(label, latency, size=len(response.content))
+    else:
+        results.add(label, latency, error=f'HTTP {response.status_code}')
+
+
+def run_user(user, scenario, url, deadline, args, results):
+    rng = random.Random(args.seed + user)
+    endpoint = url + '_dash-update-component'
+    with requests.Session() as session:
+        for dep, body in scenario.page_load():
+            post(session, endpoint, callback_label(dep), body, results, args.timeout)
+
+        state = dict(scenario.initial)
+        while time.monotonic() < deadline:
+            for dep, body in scenario.action(state, rng):
+                post(session, endpoint, callback_label(dep), body, results, args.timeout)
+            if args.think > 0:
+                time.sleep(rng.expovariate(1 / args.think))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    """Запускает дашборд локально, возвращает (процесс, базовый URL)."""
+    port = free_port()
+    env = dict(os.environ, DASH_PREFIX='/')
+    if args.data:
+        env['KC_DATA_PATH'] = os.path.abspath(args.data)
+    if args.no_cache:
+        env['KC_CALLBACK_CACHE_SIZE'] = '0'
+        env['KC_CACHE_WARMUP'] = '0'
+
+    if importlib.util.find_spec('gunicorn') is not None:
+        command = [sys.executable, '-m', 'gunicorn', 'dashboard:server', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(args.workers), '--threads', str(args.threads), '--timeout', '120']
+    else:
+        command = [sys.executable, '-c',
+                   f'import dashboard; dashboard.server.run(host="127.0.0.1", port={port}, threaded=True)']
+    print(' '.join(command), flush=True)
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=None if args.server_log else subprocess.DEVNULL,
+                               stderr=None if args.server_log else subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}/'
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            if requests.get(url + '_dash-dependencies', timeout=5).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'server did not start in {SERVER_START_TIMEOUT}s')
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f}s, {report['throughput_rps']:.1f} req/s")
+    print(f"{'callback':<36} {'reqs':>6} {'err %':>6} {'p50, ms':>8} {'p90, ms':>8} {'p99, ms':>8} "
+          f"{'max, ms':>8} {'mean, KB':>9} {'max, KB':>8}")
+    for label, stats in report['callbacks'].items():
+        print(f"{label:<36} {stats['requests']:>6} {stats['error_rate'] * 100:>6.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p90_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f} "
+              f"{stats['mean_bytes'] / 1024:>9.1f} {stats['max_bytes'] / 1024:>8.1f}")
+
+    for label, stats in report['callbacks'].items():
+        print(f'\n{label}')
+        if stats['error_kinds']:
+            print(f"    errors: {stats['error_kinds']}")
+        peak = max(stats['histogram_ms'].values()) or 1
+        for bucket, count in stats['histogram_ms'].items():
+            print(f"    {bucket + ' ms':>10} {count:>6} {'#' * round(40 * count / peak)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='адрес запущенного дашборда (по умолчанию запускается локально)')
+    parser.add_argument('--users', type=int, default=10, help='параллельных пользователей')
+    parser.add_argument('--duration', type=float, default=20, help='секунд после открытия страницы')
+    parser.add_argument('--think', type=float, default=0, help='средняя пауза между действиями, с')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут запроса, с')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='записать отчёт в JSON-файл')
+    local = parser.add_argument_group('локальный сервер')
+    local.add_argument('--data', help='выгрузка (KC_DATA_PATH), например из generate_data.py')
+    local.add_argument('--workers', type=int, default=2, help='воркеров gunicorn')
+    local.add_argument('--threads', type=int, default=4, help='потоков на воркер gunicorn')
+    local.add_argument('--no-cache', action='store_true', help='без кэша колбэков и прогрева')
+    local.add_argument('--server-log', action='store_true', help='показывать вывод сервера')
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+    url = url if url.endswith('/') else url + '/'
+
+    try:
+        dependencies = requests.get(url + '_dash-dependencies', timeout=args.timeout).json()
+        layout = requests.get(url + '_dash-layout', timeout=args.timeout).json()
+        scenario = Scenario(dependencies, layout)
+        print(f"{url}: {len(scenario.callbacks)} server callbacks, controls: {[PLAYER_PROP] + scenario.controls}")
+
+        results = Results()
+        start = time.monotonic()
+        deadline = start + args.duration
+        threads = [threading.Thread(target=run_user, args=(user, scenario, url, deadline, args, results))
+                   for user in range(args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report = results.summary(time.monotonic() - start)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report.update(url=url, users=args.users, duration=args.duration, think=args.think)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\nreport: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+LRU-кэш результатов колбэков дашборда.
+
+Колбэки - чистые функции небольшого набора элементов управления (игрок, роли,
+метрики, настройки тепловой карты) при неизменных данных, поэтому готовый
+результат можно переиспользовать. Ключ кэша - версия набора данных и
+нормализованное состояние элементов управления.
+
+Переменные окружения:
+    KC_CALLBACK_CACHE_SIZE - максимум записей на один колбэк (по умолчанию 256, 0 - без кэша)
+    KC_CACHE_WARMUP=0      - не прогревать кэш при старте (см. dashboard.warm_up_callbacks)
+"""
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get('KC_CALLBACK_CACHE_SIZE', 256))
+
+# Имя колбэка -> его кэш
+caches = {}
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш с вытеснением давно не использованных записей."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Значение по ключу; при промахе вычисляется compute() и сохраняется."""
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+
+        value = compute()
+
+        if self.maxsize > 0:
+            with self._lock:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+def memoize(name, version, normalize=None):
+    """
+    Декоратор, кэширующий результат колбэка.
+
+    :param name: Имя кэша (обычно имя колбэка).
+    :param version: Версия набора данных, входит в ключ.
+    :param normalize: Функция аргументов колбэка -> hashable ключ состояния;
+        по умолчанию ключ - сами аргументы.
+    """
+    cache = caches.setdefault(name, LRUCache())
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (version, normalize(*args) if normalize else args)
+            return cache.get(key, lambda: func(*args))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    """Счётчики попаданий и промахов всех кэшей."""
+    return {name: cache.stats() for name, cache in caches.items()}
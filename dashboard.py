@@ -2,14 +2,20 @@ import os
 from pydoc import classname
 
 import pandas as pd
-import dash
-from dash import Dash, dcc, html, Input, Output, State
+import flask
+from dash import ClientsideFunction, Dash, Patch, dcc, html, Input, Output, State
 import dash_bootstrap_components as dbc
-from prep import create_timeline, get_full_data, winrate_chart, create_cart_distibution, get_role, \
-    create_shooting_target, create_circular_layout, create_winrate_distibution, number_win_series, generate_quadrant_plot, create_heatmap, create_sankey
-
-from prep_data import analyze_pairs_optimized
-import json
+from prep import create_timeline, sort_timeline, timeline_colors, build_dataset, winrate_chart, create_cart_distibution, get_role, \
+    create_shooting_target, create_circular_layout, create_winrate_distibution, generate_quadrant_plot, create_heatmap, create_sankey
+from snapshot import load_dataset, process_memory
+from ingest import read_full_data
+
+from prep_data import PairStatsIndex
+from callback_cache import memoize, cache_stats
+from figures import compact_figure
+import metrics
+from summaries import ALL_PLAYERS, BoxCube, build_summaries, index_player_summary, index_firstshot_summary, \
+    most_shot, shot_distribution
 
 pd.options.mode.chained_assignment = None  # default='warn'
 
@@ -38,30 +44,44 @@ nickname_mapping = {
 #                               READ DATA
 # =====================================================================
 
-with open('data/tstata_kc.json') as f:
-    kc_data=json.load(f)
+DATA_PATH = os.environ.get('KC_DATA_PATH', os.path.join(here, 'data', 'tstata_kc.json'))
 
-df_games, df_firstshots = get_full_data(kc_data)
+top10_players = ['Колобок', 'KED', 'Зверюга',  'Бывшая', 'Плесень', 'GOJO',  'Лупа', 'Дантист', 'Ирландец', 'Блудница']
 
-points = df_games[['game_id', 'game_date', 'player_name']]
-points.drop_duplicates(subset=['game_date', 'player_name'], inplace=True)
 
-top10_players = df_games.groupby('player_name')['total_score'].sum().reset_index().sort_values('total_score', ascending=False).head(10)['player_name'].to_list()
-top10_players = ['Колобок', 'KED', 'Зверюга',  'Бывшая', 'Плесень', 'GOJO',  'Лупа', 'Дантист', 'Ирландец', 'Блудница']
-top_players = df_games[df_games['player_name'].isin(top10_players)]
-top_players = top_players.groupby(['game_date', 'player_name']).agg(total_score=('total_score', 'sum'),
-                                                                        game_count=(
-                                                                        'game_id', 'nunique'), ).reset_index()
+def read_dataset():
+    df_games, df_firstshots = read_full_data(DATA_PATH)
+    with metrics.stage('build_dataset'):
+        dataset = build_dataset(df_games, df_firstshots, top10_players)
+    with metrics.stage('build_summaries'):
+        dataset.update(build_summaries(dataset))
+    return dataset
+
+
+dataset, dataset_version = load_dataset(DATA_PATH, read_dataset, extra=top10_players)
+
+df_games = dataset['df_games']
+df_firstshots = dataset['df_firstshots']
+# В порядке точек графика серий - timeline_colors красит строки в этом порядке
+top_players = sort_timeline(dataset['top_players'])
 
-df_sum = df_games.groupby(['series_id', 'player_id'], as_index=False)['total_score'].sum()
+# Статистика пар топ-10 считается один раз, колбэки берут из неё срезы
+pair_index = PairStatsIndex(dataset['pair_details'], dataset['pair_stats'], players=top10_players)
 
-# 2. Присваиваем место в серии (ранг) только уникальным игрокам
-df_sum['place_in_series'] = df_sum.groupby('series_id')['total_score'].rank(ascending=False, method='min').astype(int)
+# Сводка по игрокам и ролям: {игрок: (итоги, строки по ролям)}
+player_summary = index_player_summary(dataset['player_summary'])
 
-# 3. Объединяем обратно с исходным df по 'series_id' и 'player_id'
-df1 = df_games.merge(df_sum[['series_id', 'player_id', 'place_in_series']], on=['series_id', 'player_id'], how='left')
+# Игры, победы и отстрелы по (игрок, роль, бокс) для схемы стола
+box_cube = BoxCube(dataset['box_summary'])
 
-top_players = top_players.merge(df1[['game_date', 'series_id', 'player_name', 'place_in_series']], on=['game_date', 'player_name'], how='left').drop_duplicates()
+# Первые отстрелы: {игрок: строка сводки}, самый и самый редко отстреливаемый, промахи
+firstshot_summary = index_firstshot_summary(dataset['firstshot_summary'])
+most_killed = most_shot(dataset['firstshot_summary'])
+less_killed = most_shot(dataset['firstshot_summary'], players=top10_players, ascending=True)
+firstshots_miss_value = firstshot_summary[ALL_PLAYERS]['misses']
+
+points = df_games[['game_id', 'game_date', 'player_name']]
+points.drop_duplicates(subset=['game_date', 'player_name'], inplace=True)
 
 
 
@@ -76,7 +96,8 @@ players = [
 # =====================================================================
 
 # figures for first screen
-fig_timeline_preview = create_timeline(top_players, selected_player=None)
+# График серий строится один раз, выбор игрока меняет только цвета точек (update_timeline)
+fig_timeline_preview = compact_figure(create_timeline(top_players, selected_player=None))
 
 
 
@@ -96,6 +117,8 @@ default_style = {
         "boxShadow": "0 4px 6px rgba(0, 0, 0, 0.1)"
     }
 
+selected_style = {**default_style, "border": "4px solid #f24236"}
+
 
 app = Dash(
     __name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
@@ -264,7 +287,8 @@ app.layout = html.Div([
 
                                             )
                                         ], style={"display": "flex", "alignItems": "center"}),
-                                        dcc.Graph(id="tournament-timeline", config={'displayModeBar': False},
+                                        dcc.Graph(id="tournament-timeline", figure=fig_timeline_preview,
+                                                  config={'displayModeBar': False},
                                                   style={'min-width': '1200px'})
                                     ], style={'display': 'flex'}, width=10)
                                 ], className="timeline_list"),
@@ -301,6 +325,12 @@ app.layout = html.Div([
                                         html.Div([
                                             html.Div(id="player-content", className="text-center my-4 fs-4",
                                                                                                  style={'display': 'none'}),
+                                            # Данные для выбора игрока в браузере (assets/player_selection.js)
+                                            dcc.Store(id="players-store", data={
+                                                'names': [player['name'] for player in players],
+                                                'default_style': default_style,
+                                                'selected_style': selected_style,
+                                            }),
                                             dcc.Tabs(id="tabs-with-props",
                                                      children=[
                                                          dcc.Tab(label='Бокс Аналитика',
@@ -513,45 +543,27 @@ app.layout = html.Div([
 
 
 
-# Callback для изменения текста и подсветки выбранного игрока
-outputs = [
-    Output("player-content", "children"),
-    Output("tournament-timeline", "figure")
-] + [Output(f"player-box-{i}", "style") for i in range(len(players))]
-
-@app.callback(
-    outputs,
+# Выбор игрока и подсветка аватара - на клиенте, без запроса к серверу
+app.clientside_callback(
+    ClientsideFunction(namespace='players', function_name='select'),
+    [Output("player-content", "children")] + [Output(f"player-box-{i}", "style") for i in range(len(players))],
     [Input(f"player-{i}", "n_clicks") for i in range(len(players))],
-    [State("player-content", "children")]
+    [State("player-content", "children"), State("players-store", "data")]
 )
-def update_dashboard(*args):
-    ctx = dash.callback_context
 
-    selected_style = default_style.copy()
-    selected_style["border"] = "4px solid #f24236"
-
-    if not ctx.triggered:
-        return [None, fig_timeline_preview, *([default_style] * len(players)), ]
-    else:
-        clicked_id = ctx.triggered[0]["prop_id"].split(".")[0]
-        player_index = int(clicked_id.split("-")[-1])
-        selected_player = players[player_index]['name']
 
-
-
-        # Сброс при повторном нажатии
-        current_selection = args[-1]
-
-        if current_selection == selected_player:
-            return [None, fig_timeline_preview, *([default_style] * len(players))]
-
-        fig_timeline = create_timeline(top_players, selected_player=selected_player)
-
-
-
-
-        styles = [selected_style if i == player_index else default_style for i in range(len(players))]
-        return [selected_player, fig_timeline, *styles]
+@app.callback(
+    Output("tournament-timeline", "figure"),
+    Input("player-content", "children"),
+    prevent_initial_call=True
+)
+@memoize('update_timeline', dataset_version)
+def update_timeline(selected_player):
+    # Patch меняет в графике серий только цвета точек, сам график уже в браузере
+    fig_timeline = Patch()
+    colors = timeline_colors(top_players, selected_player)
+    fig_timeline['data'][0]['marker']['color'] = colors if isinstance(colors, str) else colors.tolist()
+    return fig_timeline
 
 
 @app.callback(
@@ -569,49 +581,36 @@ def update_dashboard(*args):
 
     Input('player-content', 'children')
 )
+@memoize('update_players_dashboard', dataset_version)
 def update_players_dashboard(selected_player):
 
     number_series_win = 0
     avg_db_value = 0
 
-    if selected_player:
-        selected_df = df_games[df_games['player_name'].isin([selected_player])]
-        shots_list = df_firstshots[df_firstshots['player_name'] == selected_player]['maf_in_best'].to_list()
-        win_series = number_win_series(df_games)
-        number_series_win  = win_series[win_series['player_name'] == selected_player]['count'].values[0] if selected_player in win_series['player_name'].to_list() else 0
-        avg_db_value = (selected_df['only_dops'].mean() * 10).round(2)
+    totals, role_summary = player_summary[selected_player or ALL_PLAYERS]
 
-    else:
-        selected_df = df_games.copy()
-        shots_list = df_firstshots['maf_in_best'].to_list()
-
-    winrate_df = selected_df['score'].value_counts(normalize=True).reset_index()
-    winrate_value = (winrate_df[winrate_df['score'] == 1]['proportion'].values[0] * 100).round(0).astype(int)
-
-    fig_winrate = winrate_chart(winrate_value)
+    shots = firstshot_summary.get(selected_player or ALL_PLAYERS)
 
-    # Подсчет общего количества игр по ролям
-    total_games_by_role = selected_df.groupby('role_id').agg(total_games = ('game_id', 'nunique'),
-                                             dops = ('only_dops', 'sum')
-                                             )
-
-    # Подсчет победных игр по ролям
-    win_games_by_role = selected_df[selected_df['win_condition'] == 1]['role_id'].value_counts()
+    if selected_player:
+        number_series_win = totals['series_wins']
+        avg_db_value = totals['avg_db']
 
-    # Создаем DataFrame с играми и победами
-    role_stats = pd.DataFrame({'total_games': total_games_by_role['total_games'],
-                               'win_games': win_games_by_role,
-                               'dops': total_games_by_role['dops'].round(2)}).reset_index()
-    role_stats.rename(columns={'index': 'role_id'}, inplace=True)
+    winrate_value = (totals['score_wins'] / totals['rows'] * 100).round(0).astype(int)
 
-    # Заполняем NaN в победах нулями (если у роли нет побед)
-    role_stats['win_games'] = role_stats['win_games'].fillna(0).astype(int)
+    fig_winrate = winrate_chart(winrate_value)
 
-    # Считаем винрейт (если total_games = 0, винрейт тоже 0)
-    role_stats['winrate'] = ((role_stats['win_games'] / role_stats['total_games'].fillna(0)) * 100).round(1)
+    # Игры, победы и доп. баллы по ролям
+    role_stats = pd.DataFrame({'role_id': role_summary['role_id'],
+                               'total_games': role_summary['games'],
+                               'win_games': role_summary['wins'],
+                               'dops': role_summary['dops'].round(2),
+                               'winrate': role_summary['winrate']})
     role_stats = role_stats.merge(get_role(), on='role_id', how='left')
 
-    drawn_cards = (selected_df['role_id'].value_counts(normalize=True) * 100).round(0).astype(int).reset_index().rename(columns={'proportion': 'count'})
+    # Доли вытянутых карт по убыванию (при равенстве - в порядке первой игры на роли)
+    cards = role_summary.sort_values('first_row').set_index('role_id')
+    cards_order = cards['rows'].sort_values(ascending=False).index
+    drawn_cards = cards.loc[cards_order, ['card_share']].reset_index().rename(columns={'card_share': 'count'})
     drawn_cards = drawn_cards.merge(get_role(), on='role_id', how='left')
     cart_distibution = create_cart_distibution(drawn_cards)
 
@@ -621,13 +620,7 @@ def update_players_dashboard(selected_player):
 
 
 
-    firstshots_miss_value = df_games.shape[0] / 10 - df_firstshots.dropna(subset=['player_id', 'player_name']).shape[0]
-
-
-    fig_target = create_shooting_target(shots_list)
-
-    most_killed = df_firstshots.groupby('player_name')['game_id'].count().reset_index().sort_values('game_id', ascending=False).head(1)['player_name'].values[0]
-    less_killed = df_firstshots[df_firstshots['player_name'].isin(top10_players)].groupby('player_name')['game_id'].count().reset_index().sort_values('game_id', ascending=True).head(1)['player_name'].values[0]
+    fig_target = compact_figure(create_shooting_target(shot_distribution(shots)))
 
 
 
@@ -688,17 +681,37 @@ def update_players_dashboard(selected_player):
                 ], className="", style={"margin": 0, 'gap':'10px'})
 
 
-    return ( html.Div(selected_df['game_id'].nunique()),
+    return ( html.Div(totals['games']),
              cart_distibution,
              winrate_blocks,
              # html.Div(firstshots_miss_value),
-             html.Div(df_firstshots[df_firstshots['player_name'] == selected_player].shape[0]),
+             html.Div(shots['shots'] if selected_player and shots is not None else 0),
              fig_target,
              # firstshots_distribution,
              # html.Div(most_killed),
              killed_row_general if not selected_player else killed_row_player
             )
 
+def update_role_values(value):
+    all_values = [1, 2, 3, 4]
+    if not value:  # Если ничего не выбрано
+        return all_values
+    elif set(value) == set(all_values):  # Если выбраны все опции
+        return all_values
+    return value
+
+
+def figure_state(selected_metrics, selected_role, selected_player, heatmap_selected_role, heatmap_limit_game):
+    """Ключ кэша update_figure: одинаковые по смыслу состояния дают один ключ."""
+    roles = tuple(sorted(update_role_values(selected_role)))
+    # Порядок метрик важен: первая найденная экстремальная метрика задаёт цвет бокса
+    metric_order = tuple(selected_metrics or ())
+    if selected_player:
+        # При выбранном игроке вместо тепловой карты показывается sankey
+        return metric_order, roles, selected_player, None, None
+    return metric_order, roles, None, heatmap_selected_role, heatmap_limit_game
+
+
 @app.callback(
     Output('circular-layout', 'figure'),
     Output('heatmap-chart', 'children'),
@@ -711,55 +724,21 @@ def update_players_dashboard(selected_player):
     Input('heatmap-game', 'value')
 
 )
+@memoize('update_figure', dataset_version, normalize=figure_state)
 def update_figure(selected_metrics, selected_role, selected_player, heatmap_selected_role, heatmap_limit_game):
-
-    def update_role_values(value):
-        all_values = [1, 2, 3, 4]
-        if not value:  # Если ничего не выбрано
-            return all_values
-        elif set(value) == set(all_values):  # Если выбраны все опции
-            return all_values
-        return value
     selected_roles = update_role_values(selected_role)
 
-    detailed_stats, grouped_stats = analyze_pairs_optimized(df_games)
-
-    grouped_stats = grouped_stats[(grouped_stats['player1_name'].isin(top10_players)) & (
-        grouped_stats['player2_name'].isin(top10_players))].sort_values(by='win_rate', ascending=False)
-
     if selected_player:
-        df_active = df_games[df_games['player_name'].isin([selected_player]) & (df_games['role_id'].isin(selected_roles))]
-        df_firstshots_active = df_firstshots[df_firstshots['player_name'].isin([selected_player]) & (df_firstshots['role_id'].isin(selected_roles))]
-        grouped_stats = grouped_stats[grouped_stats['player1_name'].isin([selected_player])]
+        grouped_stats = pair_index.query(selected_player)
 
     else:
-        df_active = df_games[df_games['role_id'].isin(selected_roles)]
-        df_firstshots_active = df_firstshots[df_firstshots['role_id'].isin(selected_roles)]
-
-    # create the DataFrame with only boxNumber columns to avoid missing boxes
-    result_df = pd.DataFrame({'boxNumber':range(1,11)})
+        grouped_stats = pair_index.query()
 
-    # if selected_role
+    # Статистика по всем боксам стола, включая боксы без игр
+    result_df = box_cube.box_stats(selected_player, selected_roles)
 
-    total_winrate_by_box = df_active.groupby('boxNumber').agg(
-        total_games=('who_win', 'count'),
-        total_wins=('win_condition', 'sum')
-    ).reset_index()
-
-    total_winrate_by_box['win_rate'] = (
-                (total_winrate_by_box['total_wins'] / total_winrate_by_box['total_games']) * 100).round(1)
-
-
-    total_shots_by_box = df_firstshots_active.groupby('boxNumber')['game_id'].size().reset_index(name='shots')
-    result_df = result_df.merge(total_winrate_by_box, on='boxNumber', how='left').merge(total_shots_by_box, on='boxNumber', how='left').fillna(0)
-
-    total_circular = total_winrate_by_box.merge(total_shots_by_box, how='left', on='boxNumber')
-    total_circular.rename(columns={'game_id': 'shots', 'total_winrate':'win_rate'}, inplace=True)
-    result_df['win_rate_num'] = result_df['win_rate']
-
-
-    heatmap_figure = create_heatmap(grouped_stats, role=heatmap_selected_role,  min_winrate=50,  min_games=heatmap_limit_game)
-    sankey_figure = create_sankey(grouped_stats)
+    heatmap_figure = compact_figure(create_heatmap(grouped_stats, role=heatmap_selected_role,  min_winrate=50,  min_games=heatmap_limit_game))
+    sankey_figure = compact_figure(create_sankey(grouped_stats))
 
     radioitems_status = True if selected_player else False
     unput_status = True if selected_player else False
@@ -779,7 +758,7 @@ def update_figure(selected_metrics, selected_role, selected_player, heatmap_sele
         dcc.Graph(figure=heatmap_figure, config={'displayModeBar': False}),
     ], style={'overflow-x':'scroll'})
 
-    return  (create_circular_layout(result_df, selected_metrics),
+    return  (compact_figure(create_circular_layout(result_df, selected_metrics)),
              sankey_block if selected_player else heatmap_block,
              radioitems_options,
              unput_status)
@@ -789,6 +768,31 @@ def update_figure(selected_metrics, selected_role, selected_player, heatmap_sele
 
 
 
+def warm_up_callbacks():
+    """Заполняет кэш колбэков: общий вид и вид каждого игрока топ-10 с настройками по умолчанию."""
+    for player in [None] + top10_players:
+        update_timeline(player)
+        update_players_dashboard(player)
+        update_figure(['win_rate'], [], player, 'Мирные', 4)
+
+
+if os.environ.get('KC_CACHE_WARMUP', '1') != '0':
+    warm_up_callbacks()
+
+memory = process_memory()
+print(f"[startup] pid {os.getpid()}: rss {memory['rss'] / 2 ** 20:.1f} MB"
+      + (f", pss {memory['pss'] / 2 ** 20:.1f} MB" if 'pss' in memory else ''), flush=True)
+
+
+@server.route(f'{prefix}_cache-stats')
+def callback_cache_stats():
+    return flask.jsonify(cache_stats())
+
+
+# Метрики колбэков и подготовки данных в формате Prometheus: {prefix}metrics
+metrics.init_app(app, prefix)
+
+
     # don't run when imported, only when standalone
 if __name__ == '__main__':
     port = os.getenv("DASH_PORT", 8054)
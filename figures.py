@@ -0,0 +1,106 @@
+"""
+Компактная сериализация фигур для ответов колбэков.
+
+compact_figure переводит plotly-фигуру в словарь для dcc.Graph, который
+занимает меньше места в JSON-ответе и отображается так же:
+    - числовые массивы округляются до точности отображения (координаты -
+      4 знака, значения - 2), целые значения во float-массивах уходят целыми;
+    - даты без времени передаются как 'YYYY-MM-DD';
+    - массив одинаковых цветов или подписей заменяется одним значением;
+    - из шаблона оформления остаются только типы графиков, которые есть в
+      фигуре, без настроек отсутствующих в ней подграфиков (geo, polar, ...);
+      шаблон 'plotly' целиком - это ~7.5 КБ в каждом ответе.
+
+Сам JSON пишет plotly.io: при установленном orjson он используется
+автоматически (engine 'auto'), иначе - стандартный json.
+
+Отчёт по размерам ответов: python benchmarks/bench_figures.py
+"""
+import datetime
+
+import numpy as np
+import plotly.io as pio
+
+# Знаков после запятой для числовых свойств
+ROUND_DECIMALS = {
+    'x': 4, 'y': 4, 'x0': 4, 'x1': 4, 'y0': 4, 'y1': 4, 'ax': 4, 'ay': 4,
+    'z': 2, 'value': 2, 'text': 2, 'customdata': 2,
+}
+
+# Свойства, где одно значение равносильно одинаковому значению в каждой точке
+SCALAR_PROPS = {'color', 'textposition'}
+
+# Настройки шаблона, которые нужны только при соответствующих подграфиках
+SUBPLOT_TEMPLATE_KEYS = {'geo', 'mapbox', 'polar', 'scene', 'ternary'}
+
+
+def _round_array(values, decimals):
+    """Округляет float-массив; если все значения целые - отдаёт список int (пропуски - None)."""
+    values = np.round(values, decimals)
+    finite = np.isfinite(values)
+    if finite.any() and (values[finite] % 1 == 0).all():
+        as_int = np.where(finite, values, 0).astype('int64')
+        return np.where(finite, as_int.astype(object), None).tolist()
+    return values
+
+
+def _compact(value, key=None):
+    if isinstance(value, dict):
+        return {k: _compact(v, k) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return value
+        if all(isinstance(v, float) for v in value) and key in ROUND_DECIMALS:
+            return _compact(np.array(value), key)
+        if all(isinstance(v, (datetime.datetime, np.datetime64)) for v in value):
+            return _compact(np.array(value, dtype='datetime64[ns]'), key)
+        if key in SCALAR_PROPS and all(isinstance(v, str) and v == value[0] for v in value):
+            return value[0]
+        return [_compact(v, key) for v in value]
+
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f' and key in ROUND_DECIMALS:
+            return _round_array(value, ROUND_DECIMALS[key])
+        if value.dtype.kind == 'M' and len(value) and (value == value.astype('datetime64[D]')).all():
+            return np.datetime_as_string(value, unit='D').tolist()
+        if value.dtype.kind in 'OU' and key in SCALAR_PROPS and len(value) and (value == value.flat[0]).all():
+            return value.flat[0]
+        return value
+
+    if isinstance(value, float) and key in ROUND_DECIMALS:
+        return round(value, ROUND_DECIMALS[key])
+
+    return value
+
+
+def _prune_template(template, trace_types, layout):
+    """Шаблон только с используемыми типами графиков и подграфиками из layout."""
+    subplots = {name for name in SUBPLOT_TEMPLATE_KEYS if any(key.startswith(name) for key in layout)}
+    data = {name: traces for name, traces in template.get('data', {}).items() if name in trace_types}
+    settings = {name: value for name, value in template.get('layout', {}).items()
+                if name not in SUBPLOT_TEMPLATE_KEYS or name in subplots}
+    return {'data': data, 'layout': settings}
+
+
+def compact_figure(fig):
+    """
+    Фигура plotly -> компактный словарь {'data', 'layout'} для dcc.Graph.
+    Путь к свойствам не меняется, поэтому к результату применимы dash.Patch.
+    """
+    figure = fig.to_plotly_json()
+    layout = dict(figure.get('layout', {}))
+
+    template = layout.pop('template', None)
+    data = [_compact(trace) for trace in figure.get('data', [])]
+    layout = _compact(layout)
+    if template is not None:
+        trace_types = {trace.get('type', 'scatter') for trace in data}
+        layout['template'] = _prune_template(template, trace_types, layout)
+
+    return {'data': data, 'layout': layout}
+
+
+def figure_size(figure, engine=None):
+    """Размер JSON фигуры (словаря или go.Figure) в байтах UTF-8."""
+    return len(pio.to_json(figure, validate=False, engine=engine).encode('utf-8'))
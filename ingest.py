@@ -0,0 +1,180 @@
+"""
+Потоковое чтение tstata_kc.json.
+
+Вместо json.load (весь массив игр в памяти) + json_normalize (ещё одна полная
+копия) файл читается кусками, игры разбираются по одной, а нужные поля
+gameplayer и gamefirstshot сразу пишутся в заранее выделенные буферы колонок.
+Пиковая память пропорциональна итоговым таблицам, а не размеру JSON.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+from prep import enrich_games
+from schema import apply_schemas
+
+# Примерный размер одной записи gameplayer в JSON, для начального размера буферов
+_BYTES_PER_PLAYER_ROW = 300
+_PLAYERS_PER_GAME = 10
+
+# (колонка, поле записи, тип буфера) - колонки в порядке normalize_games
+GAMEPLAYER_FIELDS = [
+    ('game_id', 'game_id', 'int'),
+    ('player_id', 'player_id', 'int'),
+    ('player_name', 'PlayerName', 'str'),
+    ('role_id', 'role_id', 'int'),
+    ('boxNumber', 'boxNumber', 'int'),
+    ('score', 'score', 'str'),
+    ('score_dop', 'score_dop', 'str'),
+    ('score_minus', 'score_minus', 'str'),
+    ('marked_in_best', 'best', 'int'),
+]
+GAME_FIELDS = [
+    ('game_date', 'date', 'str'),
+    ('series_id', 'club_id', 'obj'),
+    ('who_win', 'winner_id', 'obj'),
+]
+GAMES_COLUMNS = ['game_id', 'game_date', 'series_id', 'player_id', 'player_name', 'role_id',
+                 'who_win', 'boxNumber', 'score', 'score_dop', 'score_minus', 'marked_in_best']
+
+FIRSTSHOT_FIELDS = [
+    ('id', 'id', 'int'),
+    ('game_id', 'game_id', 'int'),
+    ('player_id', 'player_id', 'int'),
+    ('boxNumber', 'boxNumber', 'int'),
+    ('score_firstshot', 'score', 'str'),
+    ('created_at', 'created_at', 'str'),
+    ('updated_at', 'updated_at', 'str'),
+]
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Генератор элементов JSON-массива объектов из текстового файла f.
+    В памяти держится только текущий кусок файла и один разобранный элемент.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    # start -> first -> (separator -> value)* -> ']'
+    state = 'start'
+
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos == len(buf):
+            buf, pos = f.read(chunk_size), 0
+            if not buf:
+                raise ValueError('unexpected end of JSON array')
+            continue
+
+        char = buf[pos]
+        if state == 'start':
+            if char != '[':
+                raise ValueError(f'expected JSON array, got {char!r}')
+            pos += 1
+            state = 'first'
+        elif char == ']' and state != 'value':
+            return
+        elif state == 'separator':
+            if char != ',':
+                raise ValueError(f'expected "," or "]", got {char!r}')
+            pos += 1
+            state = 'value'
+        else:
+            error = None
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                error, end = e, len(buf)
+            if end == len(buf):
+                # Элемент может продолжаться в следующем куске файла
+                chunk = f.read(chunk_size)
+                if chunk:
+                    buf, pos = buf[pos:] + chunk, 0
+                    continue
+                if error is not None:
+                    raise error
+            yield item
+            pos = end
+            state = 'separator'
+
+
+class _ColumnBuffer:
+    """Растущий буфер одной колонки поверх заранее выделенного numpy-массива."""
+
+    def __init__(self, kind, capacity):
+        self.kind = kind
+        # Целые храним во float64, чтобы пропуски (NaN) не меняли тип буфера
+        self.data = np.empty(capacity, dtype=object if kind in ('str', 'obj') else 'float64')
+        self.size = 0
+        # Повторяющиеся строки (имена, даты) храним одним объектом
+        self.strings = {} if kind == 'str' else None
+
+    def append(self, value):
+        if self.size == len(self.data):
+            data = np.empty(max(2 * len(self.data), 16), dtype=self.data.dtype)
+            data[:self.size] = self.data
+            self.data = data
+
+        if value is None:
+            value = np.nan
+        elif self.strings is not None:
+            value = self.strings.setdefault(value, value)
+        self.data[self.size] = value
+        self.size += 1
+
+    def values(self):
+        values = self.data[:self.size]
+        # Как и json_normalize: без пропусков целочисленная колонка остаётся int64
+        if self.kind == 'int' and not np.isnan(values).any():
+            return values.astype('int64')
+        return values
+
+
+def read_games(path, chunk_size=1 << 16):
+    """
+    Потоковый аналог prep.normalize_games: читает файл игр и возвращает
+    (df_games, df_firstshots) с той же схемой.
+    """
+    capacity = max(os.path.getsize(path) // _BYTES_PER_PLAYER_ROW, 16)
+    games = {name: _ColumnBuffer(kind, capacity) for name, _, kind in GAMEPLAYER_FIELDS + GAME_FIELDS}
+    firstshots = {name: _ColumnBuffer(kind, capacity // _PLAYERS_PER_GAME) for name, _, kind in FIRSTSHOT_FIELDS}
+
+    with open(path, encoding='utf-8') as f:
+        for game in iter_json_array(f, chunk_size):
+            players = game['gameplayer']
+            for player in players:
+                for name, field, _ in GAMEPLAYER_FIELDS:
+                    games[name].append(player.get(field))
+
+            for name, field, _ in GAME_FIELDS:
+                value = game.get(field)
+                buffer = games[name]
+                for _ in range(len(players)):
+                    buffer.append(value)
+
+            if 'gamefirstshot' in game:
+                shot = game['gamefirstshot'] or {}
+                for name, field, _ in FIRSTSHOT_FIELDS:
+                    firstshots[name].append(shot.get(field))
+
+    df_games = pd.DataFrame({name: games[name].values() for name in GAMES_COLUMNS})
+    df_games['game_date'] = pd.to_datetime(df_games['game_date'])
+
+    df_firstshots = pd.DataFrame({name: buffer.values() for name, buffer in firstshots.items()})
+
+    return df_games, df_firstshots
+
+
+def read_full_data(path, chunk_size=1 << 16):
+    """Потоковый аналог prep.get_full_data для файла игр."""
+    with stage('read_games'):
+        df_games, df_firstshots = read_games(path, chunk_size)
+    with stage('enrich_games'):
+        df_games, df_firstshots = enrich_games(df_games, df_firstshots)
+    with stage('apply_schemas'):
+        return apply_schemas(df_games, df_firstshots)
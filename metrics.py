@@ -0,0 +1,200 @@
+"""
+Метрики дашборда в текстовом формате Prometheus (маршрут {prefix}metrics).
+
+Собираются:
+    - по каждому серверному колбэку (запросы /_dash-update-component): число
+      запросов по HTTP-статусу, гистограммы времени ответа (с сериализацией)
+      и размера тела ответа;
+    - попадания и промахи кэша колбэков (callback_cache);
+    - длительность этапов подготовки данных (stage).
+
+Замер колбэка - два хука Flask на запрос и несколько операций со счётчиками
+под блокировкой, ответ повторно не сериализуется: размер берётся из готового
+тела. Значения хранятся в памяти процесса, у каждого воркера gunicorn свои.
+
+Переменные окружения:
+    KC_METRICS=0 - не собирать метрики и не регистрировать маршрут /metrics
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+from callback_cache import cache_stats
+
+METRICS_ENABLED = os.environ.get('KC_METRICS', '1') != '0'
+
+# Границы корзин: время ответа колбэка, с, и размер ответа, байт
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Гистограмма Prometheus: счётчики по корзинам, сумма и число наблюдений."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        """Строки _bucket (накопительные), _sum и _count."""
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+
+class Registry:
+    """Метрики колбэков и этапов подготовки данных одного процесса."""
+
+    def __init__(self):
+        self.requests = {}     # (callback, status) -> число запросов
+        self.latency = {}      # callback -> Histogram
+        self.size = {}         # callback -> Histogram
+        self.stages = {}       # stage -> (число запусков, длительность последнего, суммарная длительность)
+        self._lock = threading.Lock()
+
+    def observe_callback(self, callback, status, seconds, size):
+        with self._lock:
+            key = (callback, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if callback not in self.latency:
+                self.latency[callback] = Histogram(LATENCY_BUCKETS)
+                self.size[callback] = Histogram(SIZE_BUCKETS)
+            self.latency[callback].observe(seconds)
+            if size is not None:
+                self.size[callback].observe(size)
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            runs, _, total = self.stages.get(stage, (0, 0.0, 0.0))
+            self.stages[stage] = (runs + 1, seconds, total + seconds)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            requests = dict(self.requests)
+            histograms = [(name, {callback: _copy(h) for callback, h in source.items()})
+                          for name, source in (('kc_callback_duration_seconds', self.latency),
+                                               ('kc_callback_response_bytes', self.size))]
+            stages = dict(self.stages)
+
+        lines = ['# HELP kc_callback_requests_total Server callback requests by HTTP status.',
+                 '# TYPE kc_callback_requests_total counter']
+        for (callback, status), count in sorted(requests.items()):
+            lines.append(f'kc_callback_requests_total{_labels(callback=callback, status=status)} {count}')
+
+        helps = {'kc_callback_duration_seconds': 'Callback response time including serialization.',
+                 'kc_callback_response_bytes': 'Callback response body size.'}
+        for name, by_callback in histograms:
+            lines += [f'# HELP {name} {helps[name]}', f'# TYPE {name} histogram']
+            for callback, histogram in sorted(by_callback.items()):
+                lines.extend(histogram.samples(name, {'callback': callback}))
+
+        caches = cache_stats()
+        for name, kind, key, help_text in (
+                ('kc_callback_cache_hits_total', 'counter', 'hits', 'Callback cache hits.'),
+                ('kc_callback_cache_misses_total', 'counter', 'misses', 'Callback cache misses.'),
+                ('kc_callback_cache_entries', 'gauge', 'size', 'Callback cache entries.')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{_labels(callback=callback)} {stats[key]}' for callback, stats in sorted(caches.items())]
+        lines += ['# HELP kc_callback_cache_hit_ratio Callback cache hit ratio.',
+                  '# TYPE kc_callback_cache_hit_ratio gauge']
+        for callback, stats in sorted(caches.items()):
+            calls = stats['hits'] + stats['misses']
+            lines.append(f"kc_callback_cache_hit_ratio{_labels(callback=callback)} "
+                         f"{stats['hits'] / calls if calls else 0.0}")
+
+        for name, kind, index, help_text in (
+                ('kc_data_stage_runs_total', 'counter', 0, 'Data preparation stage runs.'),
+                ('kc_data_stage_last_seconds', 'gauge', 1, 'Duration of the last stage run.'),
+                ('kc_data_stage_seconds_total', 'counter', 2, 'Total stage duration.')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{_labels(stage=stage)} {values[index]}' for stage, values in sorted(stages.items())]
+
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(histogram):
+    copy = Histogram(histogram.buckets)
+    copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+    return copy
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels=None, **extra):
+    labels = {**(labels or {}), **extra}
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = Registry()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Замеряет длительность этапа подготовки данных (kc_data_stage_*)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    yield
+    registry.observe_stage(name, time.perf_counter() - start)
+
+
+def init_app(app, prefix='/'):
+    """
+    Подключает замер колбэков к серверу Dash-приложения app и регистрирует
+    маршрут {prefix}metrics. При KC_METRICS=0 ничего не делает.
+    """
+    if not METRICS_ENABLED:
+        return
+
+    import flask
+
+    server = app.server
+    update_path = f'{app.config.routes_pathname_prefix}_dash-update-component'
+    # Строка выходов колбэка (поле output запроса) -> имя функции
+    names = {}
+
+    def callback_name(output):
+        if output not in names:
+            callback = app.callback_map.get(output, {}).get('callback') if isinstance(output, str) else None
+            if callback is None:
+                # Неизвестные выходы не запоминаем: их набор задаёт клиент
+                return 'unknown'
+            names[output] = callback.__name__
+        return names[output]
+
+    @server.before_request
+    def start_timer():
+        if flask.request.path == update_path:
+            flask.g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def observe_callback(response):
+        start = flask.g.pop('metrics_start', None)
+        if start is not None:
+            body = flask.request.get_json(silent=True) or {}
+            size = None if response.is_streamed else response.calculate_content_length()
+            registry.observe_callback(callback_name(body.get('output')), response.status_code,
+                                      time.perf_counter() - start, size)
+        return response
+
+    @server.route(f'{prefix}metrics')
+    def metrics():
+        return flask.Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
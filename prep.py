@@ -2,8 +2,11 @@ import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
 from dash import html
-from collections import Counter
-import math
+
+from prep_data import analyze_pairs_sparse
+from series import build_series_results, player_series
+from schema import apply_schemas
+from metrics import stage
 
 
 MAFIA_COLOR = '#295883'
@@ -19,9 +22,23 @@ def get_role():
     return role
 
 
+# Эпохи начисления Ci: с даты start базовый Ci = отстрелы в серии * multiplier / 2
+CI_SCORING_ERAS = pd.DataFrame({
+    'start': pd.to_datetime(['1900-01-01', '2024-05-25']),
+    'multiplier': [0.4, 0.6],
+})
+
+# Модификатор Ci: строка - есть ли мафия в ЛХ (maf_in_best >= 1), столбец - who_win
+CI_MODIFIERS = np.array([
+    [0.25, 0.5],
+    [0.5, 1],
+])
+
+
 def calcilate_Ci(row):
     """
     Рассчитывает значение Ci на основе условий для строки DataFrame.
+    Построчная версия, эталон для calculate_ci.
     """
     # Константа для сравнения даты
     date_threshold = pd.to_datetime('2024-05-25')
@@ -48,7 +65,39 @@ def calcilate_Ci(row):
     return full_Ci * modifier
 
 
-def get_full_data(data):
+def calculate_ci(df):
+    """
+    Векторный расчёт Ci для таблицы первых отстрелов, результат совпадает
+    с df.apply(calcilate_Ci, axis=1).
+
+    :param df: DataFrame с колонками game_date, total_kill_in_series, maf_in_best, who_win.
+    :return: Series со значениями Ci.
+    """
+    # Эпоха по дате игры; NaT, как и в построчной версии, попадает в первую эпоху
+    dates = df['game_date'].to_numpy(dtype='datetime64[ns]')
+    era = np.searchsorted(CI_SCORING_ERAS['start'].to_numpy(), dates, side='right') - 1
+    era[(era < 0) | np.isnat(dates)] = 0
+    multiplier = CI_SCORING_ERAS['multiplier'].to_numpy()[era]
+
+    full_ci = df['total_kill_in_series'].to_numpy(dtype=float) * multiplier / 2
+
+    maf_in_best = df['maf_in_best']
+    has_maf = (maf_in_best >= 1).to_numpy()
+    no_maf = (maf_in_best == 0).to_numpy()
+    win = (df['who_win'] == 1).to_numpy()
+    loss = (df['who_win'] == 0).to_numpy()
+
+    # Комбинации вне таблицы (пропуски) получают модификатор 0
+    modifier = np.where((has_maf | no_maf) & (win | loss), CI_MODIFIERS[has_maf.astype(int), win.astype(int)], 0)
+
+    return pd.Series(full_ci * modifier, index=df.index)
+
+
+def normalize_games(data):
+    """
+    Разворачивает список игр в две плоские таблицы: игроки в играх
+    (gameplayer) и первые отстрелы (gamefirstshot).
+    """
     df_games = pd.json_normalize(
         data,
         record_path='gameplayer',
@@ -75,18 +124,28 @@ def get_full_data(data):
     )
     df_firstshots.rename(columns={'score': 'score_firstshot'}, inplace=True)
 
-    best_roles_dict = df_games[df_games['marked_in_best'] == 1].groupby('game_id')['role_id'].agg(list).to_dict()
-    # Применяем словарь к датафрейму
-    df_games['best_roles'] = df_games['game_id'].map(best_roles_dict)
+    return df_games, df_firstshots
 
-    # Функция для подсчета мафиозных ролей с обработкой NaN
-    def count_mafia_roles(roles):
-        if isinstance(roles, list):
-            return sum(1 for role in roles if role in [2, 3])
-        return 0
 
-    # Добавляем столбец с подсчетом мафиозных ролей среди лучших игроков
-    df_games['maf_in_best'] = df_games['best_roles'].apply(count_mafia_roles)
+def get_full_data(data):
+    with stage('normalize_games'):
+        df_games, df_firstshots = normalize_games(data)
+    with stage('enrich_games'):
+        df_games, df_firstshots = enrich_games(df_games, df_firstshots)
+    with stage('apply_schemas'):
+        return apply_schemas(df_games, df_firstshots)
+
+
+def enrich_games(df_games, df_firstshots):
+    """
+    Добавляет к таблицам из normalize_games (или ingest.read_games) расчётные
+    колонки: мафия в ЛХ, условие победы, Ci, доп. баллы и итоговый балл.
+    """
+    # Количество мафии (роли 2 и 3) среди отмеченных в ЛХ - агрегат по игре,
+    # который присоединяется ко всем строкам игры по индексу game_id
+    maf_marked = (df_games['marked_in_best'] == 1) & df_games['role_id'].isin([2, 3])
+    maf_in_best = maf_marked.groupby(df_games['game_id']).sum().rename('maf_in_best')
+    df_games = df_games.join(maf_in_best, on='game_id')
 
     # Добавляем столбец с который показывает
     df_games['win_condition'] = np.where(
@@ -98,16 +157,16 @@ def get_full_data(data):
 
     df_firstshots = df_firstshots.merge(df_games[
                                             ['game_id', 'game_date', 'player_id', 'player_name', 'role_id', 'who_win',
-                                             'best_roles', 'maf_in_best']],
+                                             'maf_in_best']],
                                         on=['game_id', 'player_id'], how='left')
 
     # добавляем столбец total_kill_in_series чтобы посчитать общее количество убийств игрока в серии
-    df_firstshots['total_kill_in_series'] = df_firstshots.groupby(['game_date', 'player_name'])['game_id'].transform(
+    df_firstshots['total_kill_in_series'] = df_firstshots.groupby(['game_date', 'player_name'], observed=True)['game_id'].transform(
         'count')
     # df_firstshots['game_date'] = pd.to_datetime(df_firstshots['game_date'])
 
 
-    df_firstshots['Ci'] = df_firstshots.apply(calcilate_Ci, axis=1)
+    df_firstshots['Ci'] = calculate_ci(df_firstshots)
 
     df_games = df_games.merge(df_firstshots[['game_id', 'player_id', 'score_firstshot', 'Ci']],
                               on=['game_id', 'player_id'], how='left')
@@ -134,41 +193,69 @@ def get_full_data(data):
     return df_games, df_firstshots
 
 
+def build_dataset(df_games, df_firstshots, players):
+    """
+    Полный набор таблиц дашборда.
+
+    :param df_games: Таблица игроков в играх из get_full_data.
+    :param df_firstshots: Таблица первых отстрелов из get_full_data.
+    :param players: Список игроков для графика серий (топ-10).
+    :return: Словарь {имя таблицы: DataFrame}.
+    """
+    series_results = build_series_results(df_games)
+    pair_details, pair_stats = analyze_pairs_sparse(df_games)
+
+    return {
+        'df_games': df_games,
+        'df_firstshots': df_firstshots,
+        'series_results': series_results,
+        'top_players': player_series(series_results, players),
+        'pair_details': pair_details.reset_index(drop=True),
+        'pair_stats': pair_stats.reset_index(drop=True),
+    }
+
+
+def timeline_colors(df, selected_player=None):
+    """
+    Цвета точек графика create_timeline: для выбранного игрока - массив по
+    строкам df (золотой - первое место в серии, красный - остальные серии
+    игрока, серый - другие игроки), без игрока - один общий цвет.
+    """
+    if not selected_player:
+        return '#f24236'
+
+    first_place_mask = (df['player_name'] == selected_player) & (df['place_in_series'] == 1)
+    selected_player_mask = df['player_name'] == selected_player
+    return np.select(
+        [first_place_mask, selected_player_mask],
+        ['#f99746', '#f24236'],  # Золотой для первых мест, красный для выбранного игрока
+        default='#e5e7eb'  # Серый для остальных
+    )
+
+
+# Отступ оси X графика серий от первой и последней даты
+TIMELINE_PADDING = pd.Timedelta(days=2)
+
+
+def sort_timeline(df):
+    """
+    Копия df в порядке точек графика create_timeline: по дате, внутри даты -
+    по возрастанию total_score (сортировка устойчивая).
+    """
+    return df.sort_values(by=['game_date', 'total_score'], ascending=[True, True], kind='stable')
+
+
 def create_timeline(df, selected_player=None):
-    # Преобразование строковых дат в формат datetime
-    # df['game_date'] = pd.to_datetime(df['game_date'])
-    df.sort_values(by=['game_date', 'total_score'], ascending=[True, True] , inplace=True)
-
-    # Группировка по дате и подсчет количества событий на каждую дату
-    grouped = df.groupby('game_date').size()
-
-    # Создание координат для точек с симметрией
-    x_coords = []
-    y_coords = []
-
-    for date, count in grouped.items():
-        # Для чётного числа точек
-        if count % 2 == 0:
-            y_values = list(range(-count // 2, count // 2))
-        else:  # Для нечётного числа точек
-            y_values = list(range(-(count // 2), count // 2 + 1))
-
-        x_coords.extend([date] * count)
-        y_coords.extend(y_values)
-
-    if selected_player:
-
-        # Создаем маску для первых мест (предполагая, что у вас есть колонка 'place' или аналогичная)
-        # Замените 'place' на вашу колонку, которая указывает на место игрока
-        first_place_mask = (df['player_name'] == selected_player) & (df['place_in_series'] == 1)
-        selected_player_mask = df['player_name'] == selected_player
-        colors = np.select(
-            [first_place_mask, selected_player_mask],
-            ['#f99746', '#f24236'],  # Золотой для первых мест, красный для выбранного игрока
-            default='#e5e7eb'  # Серый для остальных
-        )
-    else:
-        colors = '#f24236'
+    # Входной df не меняем: он общий для всех запросов
+    df = sort_timeline(df)
+
+    # Точки одной даты симметрично вокруг нуля: порядковый номер в дате минус половина их количества
+    by_date = df.groupby('game_date')
+    y_coords = by_date.cumcount() - by_date['game_date'].transform('size') // 2
+    x_coords = df['game_date'].tolist()
+    y_coords = y_coords.tolist()
+
+    colors = timeline_colors(df, selected_player)
 
 
     fig_timeline = go.Figure()
@@ -184,15 +271,13 @@ def create_timeline(df, selected_player=None):
                 size=14,
                 line=dict(color='#f24236', width=0)
             ),
-            customdata=np.stack(
-                (df['player_name'].astype('str'),
-                 df['total_score'].round(2).astype('str'),
-                 df['game_count'].round(0).astype('str')),
-                axis=-1),
+            # Имя - в text, числа - в customdata: без перевода чисел в строки
+            text=df['player_name'].astype('str').tolist(),
+            customdata=[list(point) for point in zip(df['total_score'].round(2).tolist(), df['game_count'].tolist())],
             hovertemplate='<b>%{x}</b><br>' +
-                          '%{customdata[0]}<br>'+
-                          'Cыграно: <b>%{customdata[2]}</b> игр<br>' +
-                          'Получено: <b>%{customdata[1]}</b> баллов' +
+                          '%{text}<br>'+
+                          'Cыграно: <b>%{customdata[1]}</b> игр<br>' +
+                          'Получено: <b>%{customdata[0]}</b> баллов' +
                           '<extra></extra>',
         )
     )
@@ -212,16 +297,10 @@ def create_timeline(df, selected_player=None):
     # Сдвигаем метки на середину месяца
     month_labels = month_labels + pd.Timedelta(days=14)  # примерно середина месяца
 
-    # Добавляем вертикальные линии для каждого месяца
-    for date in month_lines[1:]:
-
-        fig_timeline.add_vline(
-            x=date,
-            line_width=1,
-            line_dash="dash",
-            line_color="gray",
-            opacity=0.5
-        )
+    # Вертикальные линии в начале каждого месяца - одним списком shapes
+    month_shapes = [dict(type='line', x0=date, x1=date, xref='x', y0=0, y1=1, yref='y domain',
+                         line=dict(width=1, dash='dash', color='gray'), opacity=0.5)
+                    for date in month_lines[1:]]
 
     # Настройка осей и внешнего вида
     fig_timeline.update_layout(
@@ -236,7 +315,7 @@ def create_timeline(df, selected_player=None):
             tickfont=dict(size=12),
             showgrid=False,
             fixedrange = True,
-            range=['2024-03-23 00:00:00', '2025-01-29 00:00:00']
+            range=[str(start_date - TIMELINE_PADDING), str(end_date + TIMELINE_PADDING)]
         ),
         yaxis=dict(
             title='',
@@ -245,6 +324,7 @@ def create_timeline(df, selected_player=None):
             zeroline=False,
             fixedrange=True
         ),
+        shapes=month_shapes,
         showlegend=False,
         height=200,
     )
@@ -355,78 +435,67 @@ def create_winrate_distibution(df):
     ])
     return layout
 
-def create_shooting_target(values):
+# Цвета точек мишени по количеству черных в ЛХ (0-3)
+SHOOTING_TARGET_COLORS = ['#f24236', '#295883', '#efbf00', '#cbe5f3']
+
+# Не больше стольких точек на одном кольце мишени, остальное - в подписи с количеством
+SHOOTING_TARGET_MAX_POINTS = 40
+
+
+def _shooting_target_shapes():
+    """Кольца и оси мишени - общие для всех фигур shapes под точками."""
+    ring = dict(type='circle', xref='x', yref='y', line=dict(color='gray', width=1), layer='below')
+    axis = dict(type='line', xref='x', yref='y', line=dict(color='gray', width=1, dash='dash'), layer='below')
+    return ([dict(ring, x0=-r, y0=-r, x1=r, y1=r) for r in (1, 2)] +
+            [dict(axis, x0=-3, y0=0, x1=3, y1=0), dict(axis, x0=0, y0=-3, x1=0, y1=3)])
+
 
-    values = [x for x in values if not math.isnan(x)]
-    counts = Counter(values)
+SHOOTING_TARGET_SHAPES = _shooting_target_shapes()
 
-    # Создаем случайные координаты для точек на круге
-    n_points = len(values)
-    np.random.seed(42)
-    angles = np.random.uniform(0, 2 * np.pi, n_points)
-    # Инвертируем значения и используем их как радиус
-    radii = [3 - val for val in values]  # 3 в центре, 0 на краю
 
-    # Преобразуем полярные координаты в декартовы
-    x = [r * np.cos(theta) for r, theta in zip(radii, angles)]
-    y = [r * np.sin(theta) for r, theta in zip(radii, angles)]
+def create_shooting_target(counts):
+    """
+    Мишень первых отстрелов: кольцо 3 - v для отстрелов с v черными в ЛХ.
+
+    :param counts: Количество отстрелов по maf_in_best (Series или dict {v: n}),
+        например из summaries.shot_distribution.
+    """
+    counts = pd.Series(counts, dtype='int64')
+    counts = counts[counts > 0]
 
-    # Создаем фигуру
     fig = go.Figure()
 
-    # Добавляем круги мишени
-    for r in [1, 2]:
-        circle_points = 100
-        theta = np.linspace(0, 2 * np.pi, circle_points)
+    # Точки одного кольца: равномерно по окружности, не больше SHOOTING_TARGET_MAX_POINTS
+    annotations = []
+    for value, count in counts.items():
+        value = int(value)
+        radius = 3 - value  # 3 в центре, 0 на краю
+        n_points = min(count, SHOOTING_TARGET_MAX_POINTS)
+        # Сдвиг по кольцу, чтобы точки соседних колец не выстраивались по одним лучам
+        angles = np.pi / 4 * value + np.arange(n_points) * 2 * np.pi / n_points
+        hover = f'{value} {"черный" if value == 1 else "черных"} в ЛХ<br>Всего: {count}'
+
         fig.add_trace(go.Scatter(
-            x=r * np.cos(theta),
-            y=r * np.sin(theta),
-            mode='lines',
-            line=dict(color='gray', width=1),
-            showlegend=False,
-            hoverinfo='skip'
+            x=radius * np.cos(angles),
+            y=radius * np.sin(angles),
+            mode='markers',
+            marker=dict(size=14, color=SHOOTING_TARGET_COLORS[value]),
+            hovertext=hover,
+            hoverinfo='text'
+        ))
+        # Подпись с количеством отстрелов кольца - между точками (в центре - под точкой)
+        label_angle = np.pi / 4 * value + np.pi / n_points
+        annotations.append(dict(
+            x=radius * np.cos(label_angle) if radius else 0,
+            y=radius * np.sin(label_angle) if radius else -0.45,
+            text=f'<b>{count}</b>', showarrow=False, font=dict(size=10, color='#252525'),
+            bgcolor='rgba(255, 255, 255, 0.8)', borderpad=1, hovertext=hover
         ))
-
-    # Добавляем оси
-    fig.add_trace(go.Scatter(
-        x=[-3, 3], y=[0, 0],
-        mode='lines',
-        line=dict(color='gray', width=1, dash='dash'),
-        showlegend=False,
-        hoverinfo='skip'
-    ))
-    fig.add_trace(go.Scatter(
-        x=[0, 0], y=[-3, 3],
-        mode='lines',
-        line=dict(color='gray', width=1, dash='dash'),
-        showlegend=False,
-        hoverinfo='skip'
-    ))
-
-    # Добавляем точки
-    fig.add_trace(go.Scatter(
-        x=x,
-        y=y,
-        mode='markers',
-        marker=dict(
-            size=14,
-            color=values,
-            colorscale=['#f24236', '#295883', '#efbf00', '#cbe5f3'],
-            showscale=False,
-            # colorbar=dict(
-            #     title='Значение',
-            #     ticktext=['0', '1', '2', '3'],
-            #     tickvals=[0, 1, 2, 3]
-            # )
-            cmin=0,  # Устанавливаем минимальное значение цветовой шкалы
-            cmax=3  # Устанавливаем максимальное значение цветовой шкалы
-        ),
-        text = [f'{int(val)} {"черный" if int(val) == 1 else "черных"} в ЛХ<br>Всего: {counts[val]}' for val in values],
-        hoverinfo='text'
-    ))
 
     # Настраиваем макет
     fig.update_layout(
+        shapes=SHOOTING_TARGET_SHAPES,
+        annotations=annotations,
         margin={'t': 10, 'r': 10, 'l': 10, 'b': 10},
         dragmode=False,
         xaxis=dict(
@@ -502,27 +571,42 @@ def create_box_bars(values, param='#dsdss'):
     return fig
 
 
-def get_box_color(box_data, df, metric):
-    if metric == 'win_rate':
-        value = box_data['win_rate_num']
-        max_val = df['win_rate_num'].max()
-        min_val = df['win_rate_num'].min()
-    else:  # shots
-        value = box_data['shots']
-        max_val = df['shots'].max()
-        min_val = df['shots'].min()
+# Цвет бокса без выделения
+BOX_COLOR = "#574964"
+
+# Колонка таблицы боксов для метрики
+BOX_METRIC_COLUMNS = {'win_rate': 'win_rate_num', 'shots': 'shots'}
+
+
+def get_box_colors(df, selected_metrics):
+    """
+    Цвета боксов: для каждой метрики по порядку максимум - зелёный, минимум -
+    красный. Бокс красится первой метрикой, в которой он экстремум.
+    Максимум и минимум считаются один раз на метрику.
+    """
+    colors = np.full(len(df), BOX_COLOR, dtype=object)
+    undecided = np.ones(len(df), dtype=bool)
+
+    for metric in selected_metrics or []:
+        if not len(df):
+            break
+        values = df[BOX_METRIC_COLUMNS.get(metric, 'shots')].to_numpy()
+        is_max = values == values.max()
+        is_min = (values == values.min()) & ~is_max
+
+        colors[undecided & is_max] = GREEN_COLOR  # Зеленый для максимума
+        colors[undecided & is_min] = CITIZEN_COLOR  # Красный для минимума
+        undecided &= ~(is_max | is_min)
+
+    return colors.tolist()
 
-    if value == max_val:
-        return GREEN_COLOR  # Зеленый для максимума
-    elif value == min_val:
-        return CITIZEN_COLOR  # Красный для минимума
-    return SHERIFF_COLOR  # Станда
 
 def create_circular_layout(df, selected_metrics):
-    # Рассчитываем координаты для размещения боксов по кругу
+    # Рассчитываем координаты для размещения боксов по кругу: по боксу на строку df,
+    # первый бокс - в секторе слева от нижней точки стола
     n_boxes = len(df)
     radius = 0.92
-    start_angle = -np.pi / 2 - np.pi / 10
+    start_angle = -np.pi / 2 - np.pi / max(n_boxes, 1)
     angles = np.linspace(start_angle, start_angle + 2 * np.pi, n_boxes, endpoint=False)
 
     # Инвертируем порядок углов для движения по часовой стрелке
@@ -542,69 +626,62 @@ def create_circular_layout(df, selected_metrics):
         line_color="gray",
     )
 
-    # Добавляем боксы
-    for i, (x, y) in enumerate(zip(x_coords, y_coords)):
-        box_data = df.iloc[i]
-        # Определяем цвет бокса на основе выбранных метрик
-        box_color = "#574964"  # Standart box color
-
-        if selected_metrics:
-            for metric in selected_metrics:
-                new_color = get_box_color(box_data, df, metric)
-                if new_color != SHERIFF_COLOR:  # Если найден экстремум
-                    box_color = new_color
-                    break
-        # Добавляем бокс
-        fig.add_trace(go.Scatter(
-            x=[x],
-            y=[y],
-            mode='markers+text',
-            marker=dict(
-                size=30,
-                color=box_color,
-                line=dict(color='rgb(25, 25, 25)', width=2)
-            ),
-            text=str(box_data['boxNumber'].astype(int)),
-            textposition="middle center",
-            textfont=dict(size=12, color='white'),
-            hoverinfo='skip',
-            name=f'Box {box_data["boxNumber"].astype(int)}'
-        ))
+    box_numbers = df['boxNumber'].astype(int).astype(str).tolist()
 
-        # Добавляем аннотации для метрик
-        annotation_text = []
-        if 'win_rate' in selected_metrics:
-            annotation_text.append(f"<b>{box_data['win_rate']}%</b>")
-        if 'shots' in selected_metrics:
-            annotation_text.append(f"Убит: <b>{box_data['shots'].astype(int)}</b>")
-
-        if annotation_text:
-            # Рассчитываем позицию для аннотации (немного дальше от бокса)
-            annotation_radius = radius * 1.2
-            ann_x = annotation_radius * np.cos(angles[i])
-            ann_y = annotation_radius * np.sin(angles[i])
-
-            fig.add_annotation(
-                x=ann_x,
-                y=ann_y,
-                text='<br>'.join(annotation_text),
-                showarrow=True,
-                arrowhead=2,
-                arrowsize=1,
-                arrowwidth=2,
-                arrowcolor='#636363',
-                # color='#000',
-                ax=x * 40,
-                ay=-y * 40,
-                bordercolor='#c7c7c7',
-                borderwidth=2,
-                borderpad=4,
-                bgcolor='#ffffff',
-                opacity=0.8
-            )
+    # Все боксы - одним trace с цветом и подписью на точку
+    fig.add_trace(go.Scatter(
+        x=x_coords,
+        y=y_coords,
+        mode='markers+text',
+        marker=dict(
+            size=30,
+            color=get_box_colors(df, selected_metrics),
+            line=dict(color='rgb(25, 25, 25)', width=2)
+        ),
+        text=box_numbers,
+        textposition="middle center",
+        textfont=dict(size=12, color='white'),
+        hoverinfo='skip',
+    ))
+
+    # Аннотации для метрик
+    annotation_text = [[] for _ in range(n_boxes)]
+    if 'win_rate' in selected_metrics:
+        for lines, win_rate in zip(annotation_text, df['win_rate'].tolist()):
+            lines.append(f"<b>{win_rate}%</b>")
+    if 'shots' in selected_metrics:
+        for lines, shots in zip(annotation_text, df['shots'].astype(int).tolist()):
+            lines.append(f"Убит: <b>{shots}</b>")
+
+    # Позиция аннотации - немного дальше от бокса
+    annotation_radius = radius * 1.2
+    ann_x = annotation_radius * np.cos(angles)
+    ann_y = annotation_radius * np.sin(angles)
+
+    annotations = [
+        dict(
+            x=ann_x[i],
+            y=ann_y[i],
+            text='<br>'.join(lines),
+            showarrow=True,
+            arrowhead=2,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor='#636363',
+            ax=x_coords[i] * 40,
+            ay=-y_coords[i] * 40,
+            bordercolor='#c7c7c7',
+            borderwidth=2,
+            borderpad=4,
+            bgcolor='#ffffff',
+            opacity=0.8
+        )
+        for i, lines in enumerate(annotation_text) if lines
+    ]
 
     # Настраиваем внешний вид
     fig.update_layout(
+        annotations=annotations,
         margin={'t': 0, 'r': 0, 'l': 0, 'b': 10},
         showlegend=False,
         dragmode=False,
@@ -631,14 +708,6 @@ def create_circular_layout(df, selected_metrics):
     return fig
 
 
-def number_win_series(df):
-    # Шаг 1: Группируем по game_date и player_name и считаем сумму total_score
-    summed_scores = df.groupby(['game_date', 'player_name'], as_index=False)['total_score'].sum()
-
-    # Для каждого 'game_date' находим игрока с максимальным 'total_score'
-    max_scores = summed_scores.loc[summed_scores.groupby('game_date')['total_score'].idxmax()]
-    return max_scores['player_name'].value_counts().reset_index(name='count')
-
 def generate_quadrant_plot(df, colors=['#f24236', '#295883', '#efbf00', '#cbe5f3']):
     """
     Создает Plotly-график с квадратами в каждой четверти.
@@ -738,6 +807,36 @@ def get_colorscale(role):
             [1, 'rgb(40,40,40)']          # Очень темный серый
         ]
 
+def pair_matrices(df):
+    """
+    Симметричные матрицы винрейта и количества игр пар игроков.
+
+    Игроки кодируются индексами в отсортированном списке имён, обе матрицы
+    заполняются одной записью по массивам индексов (p1, p2) и (p2, p1).
+    Пары без данных - NaN.
+
+    :param df: Статистика пар: player1_name, player2_name, win_rate, total_games.
+    :return: (список игроков, матрица винрейта, матрица игр) - float-массивы n x n.
+    """
+    names = pd.concat([df['player1_name'], df['player2_name']], ignore_index=True)
+    codes, players = pd.factorize(names, sort=True)
+    players = players.tolist()
+    p1, p2 = codes[:len(df)], codes[len(df):]
+
+    # Строка (p1, p2) и зеркальная (p2, p1) подряд: при повторах пары
+    # остаётся значение последней строки df
+    rows = np.column_stack([p1, p2]).ravel()
+    cols = np.column_stack([p2, p1]).ravel()
+
+    n = len(players)
+    winrate_matrix = np.full((n, n), np.nan)
+    games_matrix = np.full((n, n), np.nan)
+    winrate_matrix[rows, cols] = np.repeat(df['win_rate'].to_numpy(dtype=float), 2)
+    games_matrix[rows, cols] = np.repeat(df['total_games'].to_numpy(dtype=float), 2)
+
+    return players, winrate_matrix, games_matrix
+
+
 def create_heatmap(df, role='Мирные', min_winrate=0,  min_games=0):
     ## Фильтруем данные по роли, винрейту и количеству игр
     df_filtered = df[
@@ -746,37 +845,22 @@ def create_heatmap(df, role='Мирные', min_winrate=0,  min_games=0):
         (df['total_games'] >= min_games)
         ].copy()
 
-    # Получаем уникальные имена игроков
-    players = sorted(list(set(df_filtered['player1_name'].unique()) |
-                          set(df_filtered['player2_name'].unique())))
+    players, winrate_matrix, games_matrix = pair_matrices(df_filtered)
 
     # Создаем словарь для соответствия полных и сокращенных имен
     short_names = {name: shorten_name(name) for name in players}
     players_short = [short_names[name] for name in players]
 
-    # Создаем пустые матрицы для винрейта и количества игр
-    n = len(players)
-    winrate_matrix = pd.DataFrame(None, index=players, columns=players)
-    games_matrix = pd.DataFrame(None, index=players, columns=players)
-
-    # Заполняем матрицы данными
-    for _, row in df_filtered.iterrows():
-        p1, p2 = row['player1_name'], row['player2_name']
-        winrate_matrix.loc[p1, p2] = row['win_rate']
-        winrate_matrix.loc[p2, p1] = row['win_rate']
-        games_matrix.loc[p1, p2] = row['total_games']
-        games_matrix.loc[p2, p1] = row['total_games']
-
 
     # # Получаем цветовую схему в зависимости от роли
     colorscale = get_colorscale(role)
 
     # Создаем тепловую карту
     fig = go.Figure(data=go.Heatmap(
-        z=winrate_matrix.values,
+        z=winrate_matrix,
         x=players,  # Используем сокращенные имена для осей
         y=players,
-        text=games_matrix.values,
+        text=games_matrix,
         texttemplate="%{text}",
         textfont={"size": 10},
         hoverongaps=False,
@@ -813,80 +897,47 @@ def create_heatmap(df, role='Мирные', min_winrate=0,  min_games=0):
 
     return fig
 
-def create_sankey(df):
-    # Создание нод для первого столбца - комбинация имени игрока и роли
-    df['source_node'] = df['player1_name'] + ' ' + df['role_group']
-
-    # Подготовка данных для Sankey диаграммы
-    sources = []
-    targets = []
-    values = []
-
-    # Уникальные значения для source_node (первый столбец)
-    source_nodes = df['source_node'].unique().tolist()
+# Цвета для различных ролевых групп
+SANKEY_ROLE_COLORS = {
+    'Мирные': 'rgba(242, 66, 54, 0.6)',  # Синий для мирных
+    'Мафия': 'rgba(41, 88, 131, 0.6)'  # Темно-красный для мафии
+}
 
-    # Уникальные значения для player2_name (второй столбец)
-    target_nodes = df['player2_name'].unique().tolist()
 
-    # Создаем словарь для хранения win_rate для каждого target_node
-    target_win_rates = {}
-
-    # Рассчитываем общий процент выигрыша для каждого target игрока
-    for target_node in target_nodes:
-        player_rows = df[df['player2_name'] == target_node]
-        # Если нужно средневзвешенное значение с учетом количества игр
-        weighted_win_rate = sum(player_rows['win_rate'] * player_rows['total_games']) / sum(player_rows['total_games'])
-        # Округляем до одного десятичного знака
-        target_win_rates[target_node] = round(weighted_win_rate, 1)
+def create_sankey(df):
+    # Ноды первого столбца - комбинация имени игрока и роли (колонку в df не дописываем)
+    source_node = df['player1_name'].astype(str) + ' ' + df['role_group']
+
+    # Индексы нод в порядке первого появления: сначала source, затем player2_name
+    source_codes, source_nodes = pd.factorize(source_node)
+    target_codes, target_nodes = pd.factorize(df['player2_name'].astype(str))
+    source_nodes, target_nodes = source_nodes.tolist(), target_nodes.tolist()
+
+    # Средневзвешенный по количеству игр винрейт каждого target игрока.
+    # np.add.at суммирует строки по порядку - так же, как sum() по срезу игрока
+    total_games = df['total_games'].to_numpy(dtype=float)
+    weighted = np.zeros(len(target_nodes))
+    games = np.zeros(len(target_nodes))
+    np.add.at(weighted, target_codes, df['win_rate'].to_numpy(dtype=float) * total_games)
+    np.add.at(games, target_codes, total_games)
+    # Округляем до одного десятичного знака
+    target_win_rates = [round(rate, 1) for rate in (weighted / games).tolist()]
 
     # Модифицируем target_nodes, добавляя процент выигрыша
-    target_node_labels = [f"{node} ({target_win_rates[node]}%)" for node in target_nodes]
-
-    # Создание словаря для маппинга названий нод на их индексы
-    node_indices = {node: i for i, node in enumerate(source_nodes + target_nodes)}
-
-    # Цвета для различных ролевых групп
-    role_colors = {
-        'Мирные': 'rgba(242, 66, 54, 0.6)',  # Синий для мирных
-        'Мафия': 'rgba(41, 88, 131, 0.6)'  # Темно-красный для мафии
-    }
-
-    # Заполнение источников, целей и значений
-    node_colors = []
-    for source_node in source_nodes:
-        role = source_node.split(' ')[-1]
-        node_colors.append(role_colors.get(role, 'rgba(100, 100, 100, 0.8)'))
-
-    # Добавляем цвета для target_nodes
-    for target_node in target_nodes:
-        # Можно варьировать оттенок в зависимости от win_rate
-        win_rate = target_win_rates[target_node]
-        # Например, чем выше процент, тем темнее оттенок
-        opacity = min(0.3 + win_rate / 100, 0.9)  # от 0.3 до 0.9 в зависимости от win_rate
-        node_colors.append(f'rgba(229, 231, 235, {opacity})')
-
-    # Собираем данные для связей
-    link_colors = []
-    hover_data = []
-
-    for _, row in df.iterrows():
-        source_index = node_indices[row['source_node']]
-        target_index = node_indices[row['player2_name']]
-        sources.append(source_index)
-        targets.append(target_index)
-        values.append(row['win_rate'])
-
-        # Цвет связи на основе роли
-        role = row['role_group']
-        link_colors.append(role_colors.get(role, 'gray'))
-
-        # Данные для hover
-        hover_data.append({
-            'player2_name': row['player2_name'],
-            'wins_together': row['wins_together'],
-            'total_games': row['total_games'],
-            'win_rate': row['win_rate']
-        })
+    target_node_labels = [f"{node} ({rate}%)" for node, rate in zip(target_nodes, target_win_rates)]
+
+    # Цвет source ноды - по роли, цвет target ноды темнее при большем win_rate (от 0.3 до 0.9)
+    first_rows = np.unique(source_codes, return_index=True)[1]
+    source_roles = df['role_group'].to_numpy()[first_rows]
+    node_colors = [SANKEY_ROLE_COLORS.get(role, 'rgba(100, 100, 100, 0.8)') for role in source_roles]
+    node_colors += [f'rgba(229, 231, 235, {min(0.3 + rate / 100, 0.9)})' for rate in target_win_rates]
+
+    # Связи: индексы нод, цвет по роли и данные для hover
+    sources = source_codes.tolist()
+    targets = (target_codes + len(source_nodes)).tolist()
+    values = df['win_rate'].tolist()
+    link_colors = df['role_group'].map(SANKEY_ROLE_COLORS).fillna('gray').tolist()
+    hover_data = df[['player2_name', 'wins_together', 'total_games', 'win_rate']].to_dict('records')
 
     # Создание Sankey диаграммы
     fig = go.Figure(data=[go.Sankey(
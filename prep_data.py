@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -39,21 +40,15 @@ def analyze_pairs_optimized(df):
     pairs = pairs[roles_mask]
 
     # Добавляем столбец с группой ролей
-    def get_role_group(row):
-        if row['role1'] in [1, 4] and row['role2'] in [1, 4]:
-            return 'Мирные'
-        elif row['role1'] in [2, 3] and row['role2'] in [2, 3]:
-            return 'Мафия'
-        else:
-            return 'Другое'
-
-    pairs['role_group'] = pairs.apply(get_role_group, axis=1)
+    citizens = pairs['role1'].isin([1, 4]) & pairs['role2'].isin([1, 4])
+    mafia = pairs['role1'].isin([2, 3]) & pairs['role2'].isin([2, 3])
+    pairs['role_group'] = np.select([citizens, mafia], ['Мирные', 'Мафия'], default='Другое')
 
     # Получаем детальную статистику по всем комбинациям
     detailed_stats = pairs.groupby([
         'player1_id', 'player1_name', 'role1',
         'player2_id', 'player2_name', 'role2'
-    ]).agg({
+    ], observed=True).agg({
         'game_id': 'count',
         'win_condition': 'sum'
     }).reset_index()
@@ -70,7 +65,7 @@ def analyze_pairs_optimized(df):
         'player1_id', 'player1_name',
         'player2_id', 'player2_name',
         'role_group'
-    ]).agg({
+    ], observed=True).agg({
         'game_id': 'count',
         'win_condition': 'sum'
     }).reset_index()
@@ -93,4 +88,161 @@ def analyze_pairs_optimized(df):
     # # Удаляем дубликаты по этому ключу, оставляя только первое вхождение
     # grouped_stats = grouped_stats.drop_duplicates(subset="pair_key").drop(columns=["pair_key"])
 
-    return detailed_stats, grouped_stats
\ No newline at end of file
+    return detailed_stats, grouped_stats
+
+
+class PairStatsIndex:
+    """
+    Статистика пар, посчитанная один раз на версию данных, с быстрыми
+    выборками по игроку и группе ролей вместо пересчёта в каждом колбэке.
+    """
+
+    def __init__(self, detailed_stats, grouped_stats, players=None):
+        """
+        :param detailed_stats: Детальная статистика из analyze_pairs_optimized.
+        :param grouped_stats: Статистика по группам ролей из analyze_pairs_optimized.
+        :param players: Если задан - оставляем только пары, где оба игрока из списка.
+        """
+        if players is not None:
+            detailed_stats = detailed_stats[detailed_stats['player1_name'].isin(players) &
+                                            detailed_stats['player2_name'].isin(players)]
+            grouped_stats = grouped_stats[grouped_stats['player1_name'].isin(players) &
+                                          grouped_stats['player2_name'].isin(players)]
+
+        self.detailed_stats = detailed_stats
+        self.grouped_stats = grouped_stats.sort_values(by='win_rate', ascending=False)
+
+        # groupby сохраняет порядок строк внутри группы (по убыванию win_rate)
+        self._by_player = dict(tuple(self.grouped_stats.groupby('player1_name', sort=False)))
+        self._by_player_role = dict(tuple(self.grouped_stats.groupby(['player1_name', 'role_group'], sort=False)))
+        self._by_role = dict(tuple(self.grouped_stats.groupby('role_group', sort=False)))
+        self._details_by_player = dict(tuple(self.detailed_stats.groupby('player1_name', sort=False)))
+
+    def query(self, player=None, role_group=None):
+        """
+        Пары игрока (или все пары, если player не задан) по убыванию win_rate.
+
+        :param player: Имя игрока (player1_name).
+        :param role_group: 'Мирные' или 'Мафия'; None - все группы.
+        :return: DataFrame в формате grouped_stats.
+        """
+        if player is None and role_group is None:
+            result = self.grouped_stats
+        elif role_group is None:
+            result = self._by_player.get(player)
+        elif player is None:
+            result = self._by_role.get(role_group)
+        else:
+            result = self._by_player_role.get((player, role_group))
+        return self.grouped_stats.iloc[:0] if result is None else result
+
+    def details(self, player):
+        """Детальная статистика пар игрока по сочетаниям ролей."""
+        result = self._details_by_player.get(player)
+        return self.detailed_stats.iloc[:0] if result is None else result
+
+
+# Допустимые сочетания ролей в паре для каждой группы ролей
+ROLE_GROUP_PAIRS = {
+    'Мирные': [(1, 1), (1, 4), (4, 1)],
+    'Мафия': [(2, 2), (2, 3), (3, 2)],
+}
+
+
+def _pair_arrays(pairs, player_ids):
+    """
+    Ненулевые элементы матрицы пар -> (игрок 1, игрок 2, игр вместе, побед вместе).
+    Вещественная часть элемента - совместные игры, мнимая - совместные победы.
+    """
+    pairs = pairs.tocoo()
+    # Пары игрока с самим собой не считаются (как в analyze_pairs_optimized - по id)
+    mask = player_ids[pairs.row] != player_ids[pairs.col]
+    values = pairs.data[mask]
+    return pairs.row[mask], pairs.col[mask], values.real.round().astype('int64'), values.imag.round().astype('int64')
+
+
+def _pairs_table(p1, p2, total, wins, keys, player_ids, player_names):
+    """
+    Таблица пар в порядке groupby из analyze_pairs_optimized. Сортировка идёт
+    по целочисленным рангам игроков, имена подставляются только в конце.
+    """
+    order = np.lexsort(keys[::-1])
+    p1, p2 = p1[order], p2[order]
+    table = pd.DataFrame({
+        'player1_id': player_ids[p1],
+        'player1_name': player_names[p1],
+        'player2_id': player_ids[p2],
+        'player2_name': player_names[p2],
+        'total_games': total[order],
+        'wins_together': wins[order],
+    })
+    table['win_rate'] = (table['wins_together'] / table['total_games'] * 100).round(2)
+    return table, order
+
+
+def analyze_pairs_sparse(df):
+    """
+    Та же статистика пар, что и analyze_pairs_optimized, но через разреженные
+    матрицы: игры и игроки кодируются целыми индексами, для каждой роли r
+    строится матрица X_r (игры x игроки), и совместные игры пары ролей (a, b) -
+    это X_a^T X_b. Победы идут мнимой частью: (X_a + i * W_a)^T X_b, где W_a -
+    X_a, умноженная на win_condition, так что игры и победы считаются одним
+    произведением. Память растёт с числом реальных пар игроков, а не с
+    игроками^2 в каждой игре.
+
+    Parameters:
+    df (pandas.DataFrame): Датафрейм с игровыми данными
+
+    Returns:
+    tuple: (полная статистика пар, агрегированная статистика по группам ролей)
+    """
+    from scipy import sparse
+
+    game_codes = pd.factorize(df['game_id'])[0]
+    player_codes, players = pd.MultiIndex.from_arrays([df['player_id'], df['player_name']]).factorize()
+    player_ids = players.get_level_values(0).to_numpy()
+    player_names = players.get_level_values(1).to_numpy(dtype=object)
+    shape = (game_codes.max() + 1 if len(game_codes) else 0, len(players))
+
+    # Ранг игрока в порядке сортировки (player_id, player_name)
+    player_rank = np.empty(len(players), dtype='int64')
+    player_rank[players.argsort()] = np.arange(len(players))
+
+    roles = df['role_id'].to_numpy()
+    win_condition = df['win_condition'].to_numpy(dtype=float)
+
+    games_by_role, results_by_role = {}, {}
+    for role in (1, 2, 3, 4):
+        mask = roles == role
+        index = (game_codes[mask], player_codes[mask])
+        games_by_role[role] = sparse.csr_matrix((np.ones(mask.sum()), index), shape=shape)
+        results_by_role[role] = sparse.csr_matrix((1 + 1j * win_condition[mask], index), shape=shape)
+
+    detailed, grouped = [], []
+    # Группы в алфавитном порядке - как их отсортировал бы groupby
+    for group_rank, role_group in enumerate(sorted(ROLE_GROUP_PAIRS)):
+        group_pairs = sparse.csr_matrix((shape[1], shape[1]), dtype=complex)
+
+        for role1, role2 in ROLE_GROUP_PAIRS[role_group]:
+            pairs = results_by_role[role1].T @ games_by_role[role2]
+            group_pairs = group_pairs + pairs
+
+            p1, p2, total, wins = _pair_arrays(pairs, player_ids)
+            detailed.append((p1, p2, total, wins, np.full(len(p1), role1), np.full(len(p1), role2)))
+
+        p1, p2, total, wins = _pair_arrays(group_pairs, player_ids)
+        grouped.append((p1, p2, total, wins, np.full(len(p1), group_rank)))
+
+    p1, p2, total, wins, role1, role2 = (np.concatenate(column) for column in zip(*detailed))
+    detailed_stats, order = _pairs_table(p1, p2, total, wins, [player_rank[p1], role1, player_rank[p2], role2],
+                                         player_ids, player_names)
+    detailed_stats.insert(2, 'role1', role1[order])
+    detailed_stats.insert(5, 'role2', role2[order])
+
+    p1, p2, total, wins, group_rank = (np.concatenate(column) for column in zip(*grouped))
+    grouped_stats, order = _pairs_table(p1, p2, total, wins, [player_rank[p1], player_rank[p2], group_rank],
+                                        player_ids, player_names)
+    grouped_stats.insert(4, 'role_group', np.array(sorted(ROLE_GROUP_PAIRS), dtype=object)[group_rank[order]])
+    grouped_stats = grouped_stats.sort_values(['wins_together', 'win_rate'], ascending=[False, False])
+
+    return detailed_stats, grouped_stats
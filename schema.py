@@ -0,0 +1,120 @@
+"""
+Компактные типы колонок df_games и df_firstshots.
+
+После разбора JSON имена, серии и победитель хранятся как object, роли, боксы
+и флаги - как int64, баллы - как float64. Схема ниже задаёт для них компактные
+типы: категории для повторяющихся строк и серий, int8 для ролей, боксов и
+флагов, float32 для баллов. float32 применяется только если значения колонки
+переводятся в него и обратно без потерь, иначе колонка остаётся float64 -
+результаты расчётов не меняются.
+
+Отчёт по памяти до и после: python schema.py [путь к tstata_kc.json]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Колонка -> компактный тип. 'float32' - только при точном обратном переводе;
+# целые типы - только если в колонке нет пропусков
+GAMES_SCHEMA = {
+    'series_id': 'category',
+    'player_name': 'category',
+    'role_id': 'int8',
+    'who_win': 'int8',
+    'boxNumber': 'int8',
+    'score': 'float32',
+    'score_dop': 'float32',
+    'score_minus': 'float32',
+    'marked_in_best': 'int8',
+    'maf_in_best': 'int8',
+    'win_condition': 'int8',
+    'score_firstshot': 'float32',
+    'Ci': 'float32',
+    'only_dops': 'float32',
+    'total_score': 'float32',
+}
+
+FIRSTSHOTS_SCHEMA = {
+    'player_name': 'category',
+    'role_id': 'float32',
+    'boxNumber': 'float32',
+    'who_win': 'float32',
+    'maf_in_best': 'float32',
+    'total_kill_in_series': 'float32',
+    'Ci': 'float32',
+}
+
+
+def _compact_dtype(series, dtype):
+    """Тип, в который колонку можно перевести без потери значений, или None."""
+    if dtype == 'category':
+        return dtype
+
+    if dtype == 'float32':
+        values = pd.to_numeric(series).to_numpy(dtype='float64')
+        exact = np.array_equal(values.astype('float32').astype('float64'), values, equal_nan=True)
+        return dtype if exact else None
+
+    # Целые: без пропусков и в пределах типа
+    values = pd.to_numeric(series)
+    if values.isna().any():
+        return None
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max or (values % 1 != 0).any()):
+        return None
+    return dtype
+
+
+def apply_schema(df, schema):
+    """
+    Переводит колонки df в типы из schema там, где это не меняет значений.
+    Колонки, которых нет в df, пропускаются. Возвращает новый DataFrame.
+    """
+    dtypes = {}
+    for column, dtype in schema.items():
+        if column in df.columns:
+            compact = _compact_dtype(df[column], dtype)
+            if compact is not None:
+                dtypes[column] = compact
+    return df.astype(dtypes)
+
+
+def apply_schemas(df_games, df_firstshots):
+    """Компактная схема для пары таблиц из prep.enrich_games."""
+    return apply_schema(df_games, GAMES_SCHEMA), apply_schema(df_firstshots, FIRSTSHOTS_SCHEMA)
+
+
+def memory_report(before, after, name=''):
+    """
+    Печатает размер каждой колонки (memory_usage(deep=True)) до и после
+    перевода в компактную схему.
+
+    :return: DataFrame column, dtype_before, dtype_after, bytes_before, bytes_after.
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'bytes_after': after.memory_usage(index=False, deep=True),
+    })
+    report.index.name = 'column'
+    report = report.reset_index()
+
+    total_before, total_after = report['bytes_before'].sum(), report['bytes_after'].sum()
+    print(f'{name} ({len(before)} rows)')
+    print(report.to_string(index=False))
+    print(f'total: {total_before:,} -> {total_after:,} bytes ({total_after / max(total_before, 1):.0%})\n')
+    return report
+
+
+if __name__ == '__main__':
+    from ingest import read_games
+    from prep import enrich_games
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'data', 'tstata_kc.json')
+    games, firstshots = enrich_games(*read_games(path))
+    compact_games, compact_firstshots = apply_schemas(games, firstshots)
+    memory_report(games, compact_games, 'df_games')
+    memory_report(firstshots, compact_firstshots, 'df_firstshots')
@@ -0,0 +1,55 @@
+"""
+Итоги серий.
+
+Серия - игры одного клубного вечера (series_id). Таблица итогов считается один
+раз на набор данных: по строке на (серия, игрок) с суммой баллов, числом игр,
+местом и признаком победы. Панель игрока, график серий и таблицы лидеров
+читают готовые строки вместо пересчёта по df_games.
+"""
+
+SERIES_KEY = 'series_id'
+
+
+def build_series_results(df_games):
+    """
+    Итоги всех серий.
+
+    Место - ранг суммы total_score в серии ('min', 1 - лучший). Победитель
+    серии - игрок с максимальной суммой, при равенстве - первый по имени.
+
+    :return: DataFrame series_id, game_date, player_id, player_name,
+        total_score, games, place_in_series, is_winner, отсортированный
+        по (game_date, player_name).
+    """
+    results = df_games.groupby([SERIES_KEY, 'player_id'], as_index=False, sort=False, observed=True).agg(
+        game_date=('game_date', 'min'),
+        player_name=('player_name', 'first'),
+        total_score=('total_score', 'sum'),
+        games=('game_id', 'nunique'),
+    )
+    results['place_in_series'] = results.groupby(SERIES_KEY, observed=True)['total_score'].rank(
+        ascending=False, method='min').astype(int)
+
+    results = results.sort_values(['game_date', 'player_name'], ignore_index=True)
+    # sort_values устойчивая: внутри серии при равной сумме первым остаётся первый по имени
+    winners = results.sort_values('total_score', ascending=False, kind='stable').drop_duplicates(SERIES_KEY).index
+    results['is_winner'] = results.index.isin(winners)
+
+    return results[[SERIES_KEY, 'game_date', 'player_id', 'player_name', 'total_score', 'games',
+                    'place_in_series', 'is_winner']]
+
+
+def series_wins(series_results):
+    """Число выигранных серий по игрокам (Series, индекс - player_name)."""
+    return series_results.loc[series_results['is_winner'], 'player_name'].value_counts()
+
+
+def player_series(series_results, players):
+    """
+    Серии игроков из списка players - данные для графика create_timeline:
+    game_date, player_name, total_score, game_count, series_id, place_in_series.
+    """
+    top_players = series_results[series_results['player_name'].isin(players)]
+    top_players = top_players.rename(columns={'games': 'game_count'})
+    return top_players[['game_date', 'player_name', 'total_score', 'game_count', SERIES_KEY,
+                        'place_in_series']].reset_index(drop=True)
@@ -0,0 +1,283 @@
+"""
+Снапшот подготовленных таблиц дашборда.
+
+Каждая таблица хранится поколоночно: одна колонка - один .npy файл, описание
+колонок - в manifest.json. Каталог снапшота называется по хэшу исходного JSON
+и версии кода, поэтому при изменении данных или prep.py снапшот пересобирается
+автоматически, а при старте воркер читает готовые колонки вместо разбора JSON.
+
+Снапшоты каждого исходного файла лежат в своём подкаталоге
+(KC_SNAPSHOT_DIR/<хэш пути к JSON>/<ключ>). После записи нового снапшота
+удаляются прежние версии того же файла старше SNAPSHOT_KEEP_SECONDS: более
+свежие могут ещё читать воркеры предыдущей версии кода при поэтапном
+перезапуске. Снапшоты других файлов данных не трогаются.
+
+В режиме KC_SNAPSHOT_MMAP=1 числовые, datetime и категориальные колонки не
+читаются в память, а отображаются (np.load(mmap_mode='r')) только для чтения:
+все воркеры gunicorn разделяют одни и те же страницы файлов через page cache.
+Колонки таких таблиц нельзя менять на месте.
+
+Переменные окружения:
+    KC_SNAPSHOT=0      - не использовать снапшот (всегда пересчитывать)
+    KC_SNAPSHOT_DIR    - каталог для снапшотов (по умолчанию data/.snapshot)
+    KC_SNAPSHOT_MMAP=1 - отображать колонки в память вместо чтения
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+SNAPSHOT_ENABLED = os.environ.get('KC_SNAPSHOT', '1') != '0'
+SNAPSHOT_DIR = os.environ.get('KC_SNAPSHOT_DIR', os.path.join(here, 'data', '.snapshot'))
+SNAPSHOT_MMAP = os.environ.get('KC_SNAPSHOT_MMAP', '0') == '1'
+
+# Прежние версии снапшота моложе этого не удаляются
+SNAPSHOT_KEEP_SECONDS = 3600
+
+# Увеличивать при изменении формата хранения колонок
+SNAPSHOT_FORMAT = 1
+
+# Модули, от которых зависит содержимое снапшота (dashboard.read_dataset задаёт набор таблиц)
+CODE_FILES = ['prep.py', 'prep_data.py', 'series.py', 'summaries.py', 'schema.py', 'ingest.py', 'snapshot.py',
+              'dashboard.py']
+
+# Типы значений object-колонок, которые можно хранить словарём в manifest.json
+_JSON_SCALARS = (str, int, float, bool)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha256 файла, читается кусками."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version():
+    """Хэш исходников, от которых зависит результат подготовки данных."""
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+    for name in CODE_FILES:
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def dataset_key(source_path, extra=None):
+    """
+    Ключ версии набора данных: исходный JSON + версия кода + доп. параметры
+    построения (например, список топ-игроков).
+    """
+    digest = hashlib.sha256()
+    digest.update(file_hash(source_path).encode())
+    digest.update(code_version().encode())
+    digest.update(json.dumps(extra, sort_keys=True, ensure_ascii=False).encode())
+    return digest.hexdigest()[:16]
+
+
+def _save_column(path, series):
+    """Сохраняет колонку в path (.npy) и возвращает её описание для манифеста."""
+    dtype = series.dtype
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        np.save(path, series.cat.codes.to_numpy())
+        return {'kind': 'category', 'categories': series.cat.categories.tolist(), 'ordered': bool(dtype.ordered)}
+
+    if pd.api.types.is_datetime64_dtype(dtype):
+        np.save(path, series.to_numpy().view('int64'))
+        return {'kind': 'datetime', 'dtype': str(dtype)}
+
+    if dtype != object:
+        np.save(path, series.to_numpy())
+        return {'kind': 'numeric'}
+
+    # object: строки и числа кодируем словарём, всё остальное - pickle
+    try:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        values = uniques.tolist()
+    except TypeError:
+        values = None
+    if values is not None and all(type(v) in _JSON_SCALARS for v in values):
+        np.save(path, codes)
+        return {'kind': 'object', 'values': values}
+
+    np.save(path, series.to_numpy(), allow_pickle=True)
+    return {'kind': 'pickle'}
+
+
+def _load_column(path, spec, mmap=False):
+    kind = spec['kind']
+    if kind == 'pickle':
+        return np.load(path, allow_pickle=True)
+
+    values = np.load(path, mmap_mode='r' if mmap else None)
+    if kind == 'numeric':
+        return values
+    if kind == 'datetime':
+        return values.view(spec['dtype'])
+    if kind == 'category':
+        dtype = pd.CategoricalDtype(spec['categories'], ordered=spec['ordered'])
+        return pd.Categorical.from_codes(values, dtype=dtype)
+
+    # object: код -1 (пропуск) указывает на последний элемент - NaN
+    lookup = np.empty(len(spec['values']) + 1, dtype=object)
+    lookup[:-1] = spec['values']
+    lookup[-1] = np.nan
+    return lookup[values]
+
+
+def source_dir(source_path):
+    """Подкаталог снапшотов исходного файла: по хэшу абсолютного пути."""
+    return hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:8]
+
+
+def remove_stale(path, keep_seconds=SNAPSHOT_KEEP_SECONDS):
+    """
+    Удаляет соседние с path каталоги снапшотов (другие версии данных или кода
+    того же исходного файла), записанные раньше чем keep_seconds назад.
+    Временные каталоги .tmp-* не трогаются: их может дописывать параллельно
+    стартующий воркер.
+    """
+    parent, keep = os.path.split(path)
+    deadline = time.time() - keep_seconds
+    for name in os.listdir(parent):
+        manifest = os.path.join(parent, name, 'manifest.json')
+        try:
+            stale = name != keep and not name.startswith('.') and os.path.getmtime(manifest) < deadline
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def save_frames(path, frames):
+    """
+    Записывает словарь таблиц в каталог path. Запись идёт во временный каталог,
+    который затем переименовывается, поэтому параллельно стартующие воркеры
+    не увидят недописанный снапшот.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+
+    try:
+        manifest = {'format': SNAPSHOT_FORMAT, 'frames': {}}
+        for name, frame in frames.items():
+            os.makedirs(os.path.join(tmp_path, name))
+            columns = []
+            for i, column in enumerate(frame.columns):
+                spec = _save_column(os.path.join(tmp_path, name, f'{i}.npy'), frame[column])
+                spec['name'] = column
+                columns.append(spec)
+            manifest['frames'][name] = {'rows': len(frame), 'columns': columns}
+
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Снапшот уже записан другим воркером
+            if not os.path.exists(os.path.join(path, 'manifest.json')):
+                raise
+        else:
+            remove_stale(path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_frames(path, mmap=False):
+    """
+    Читает словарь таблиц, записанный save_frames. Индекс - RangeIndex.
+    При mmap=True колонки отображаются в память только для чтения.
+    """
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format'] != SNAPSHOT_FORMAT:
+        raise ValueError(f"snapshot format {manifest['format']} != {SNAPSHOT_FORMAT}")
+
+    frames = {}
+    for name, frame_spec in manifest['frames'].items():
+        data = {}
+        for i, spec in enumerate(frame_spec['columns']):
+            data[spec['name']] = _load_column(os.path.join(path, name, f'{i}.npy'), spec, mmap)
+        # copy=False: колонки остаются отдельными массивами (в т.ч. отображёнными)
+        frames[name] = pd.DataFrame(data, index=pd.RangeIndex(frame_spec['rows']), copy=False)
+    return frames
+
+
+def load_dataset(source_path, build, extra=None):
+    """
+    Возвращает таблицы дашборда и ключ версии данных.
+
+    Если снапшот для текущего хэша исходного файла и кода существует - таблицы
+    читаются из него. Иначе вызывается build() и результат записывается в новый
+    снапшот. Время загрузки (или пересчёта) печатается в лог.
+
+    :param source_path: Путь к исходному JSON.
+    :param build: Функция без аргументов, возвращающая {имя: DataFrame}.
+    :param extra: JSON-сериализуемые параметры построения, входящие в ключ.
+    :return: (словарь таблиц, ключ версии данных)
+    """
+    key = dataset_key(source_path, extra)
+
+    if not SNAPSHOT_ENABLED:
+        start = time.perf_counter()
+        frames = build()
+        print(f'[snapshot] disabled, data prepared in {time.perf_counter() - start:.3f}s', flush=True)
+        return frames, key
+
+    path = os.path.join(SNAPSHOT_DIR, source_dir(source_path), key)
+
+    start = time.perf_counter()
+    try:
+        with stage('snapshot_load'):
+            frames = load_frames(path, SNAPSHOT_MMAP)
+        print(f'[snapshot] {key}: loaded in {time.perf_counter() - start:.3f}s{" (mmap)" if SNAPSHOT_MMAP else ""}',
+              flush=True)
+        return frames, key
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f'[snapshot] {key}: unreadable ({e!r}), rebuilding', flush=True)
+
+    start = time.perf_counter()
+    frames = build()
+    build_time = time.perf_counter() - start
+    save_frames(path, frames)
+
+    # Возвращаем прочитанные из снапшота таблицы, чтобы типы колонок
+    # совпадали с тем, что получат следующие старты
+    start = time.perf_counter()
+    with stage('snapshot_load'):
+        frames = load_frames(path, SNAPSHOT_MMAP)
+    load_time = time.perf_counter() - start
+    print(f'[snapshot] {key}: rebuilt in {build_time:.3f}s, snapshot load {load_time:.3f}s', flush=True)
+    return frames, key
+
+
+def process_memory():
+    """
+    Память текущего процесса в байтах: rss, pss (rss с разделяемыми страницами,
+    поделёнными между процессами) и shared. pss доступен только в Linux.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+    except OSError:
+        import resource
+        # ru_maxrss - пиковое значение, в Linux в КБ, в macOS в байтах
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+    def kb(name):
+        return int(fields.get(name, '0 kB').split()[0]) * 1024
+
+    return {'rss': kb('Rss'), 'pss': kb('Pss'), 'shared': kb('Shared_Clean') + kb('Shared_Dirty')}
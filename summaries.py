@@ -0,0 +1,233 @@
+"""
+Предрасчитанные сводные таблицы для панелей дашборда.
+
+Считаются один раз на версию набора данных (вместе со снапшотом), колбэки
+только выбирают из них нужный блок строк.
+"""
+import numpy as np
+import pandas as pd
+
+from series import series_wins
+
+# Ключ "все игроки" в сводных таблицах
+ALL_PLAYERS = '*'
+
+# role_id строки с итогами игрока по всем ролям
+ALL_ROLES = 0
+
+# Роли за столом
+ROLES = [1, 2, 3, 4]
+
+# Возможные значения maf_in_best - сколько черных игроков в ЛХ
+MAF_IN_BEST = [0, 1, 2, 3]
+
+
+def _role_summary(df, keys):
+    """Игры, победы и баллы по ключам keys (последний ключ - role_id или итог)."""
+    summary = df.groupby(keys, sort=True, observed=True).agg(
+        rows=('game_id', 'size'),
+        games=('game_id', 'nunique'),
+        wins=('win_condition', 'sum'),
+        score_wins=('score_win', 'sum'),
+        dops=('only_dops', 'sum'),
+        # Позиция первой строки - для порядка как у value_counts при равных значениях
+        first_row=('row', 'min'),
+    )
+    return summary.reset_index()
+
+
+def build_player_summary(df_games, series_results):
+    """
+    Сводка по игрокам и ролям для панели игрока.
+
+    Для каждого игрока (и для ALL_PLAYERS) строка role_id = ALL_ROLES содержит
+    итоги по всем ролям, строки role_id 1-4 - по каждой роли:
+    rows, games, wins, score_wins, dops, winrate, card_share, first_row;
+    в итоговой строке также series_wins и avg_db (средний ДБ за 10 игр).
+    """
+    df = df_games[['game_id', 'player_name', 'role_id', 'win_condition', 'score', 'only_dops']].copy()
+    df['score_win'] = (df['score'] == 1).astype(int)
+    df['row'] = range(len(df))
+    df['all_players'] = ALL_PLAYERS
+    df['all_roles'] = ALL_ROLES
+
+    parts = []
+    for player_key in ('player_name', 'all_players'):
+        for role_key in ('role_id', 'all_roles'):
+            part = _role_summary(df, [player_key, role_key])
+            parts.append(part.rename(columns={player_key: 'player_name', role_key: 'role_id'}))
+    summary = pd.concat(parts, ignore_index=True)
+
+    summary['winrate'] = (summary['wins'] / summary['games'] * 100).round(1)
+
+    totals = summary[summary['role_id'] == ALL_ROLES].set_index('player_name')
+    player_rows = summary['player_name'].map(totals['rows'])
+    summary['card_share'] = (summary['rows'] / player_rows * 100).round(0).astype(int)
+
+    # Итоговые показатели игрока - только в строке ALL_ROLES
+    is_total = summary['role_id'] == ALL_ROLES
+    # Series.mean, а не groupby.mean: то же суммирование, что и при расчёте по срезу игрока
+    avg_db = df.groupby('player_name', observed=True)['only_dops'].agg(lambda s: s.mean()) * 10
+    summary['series_wins'] = summary['player_name'].map(series_wins(series_results)).where(is_total).fillna(0).astype(int)
+    summary['avg_db'] = summary['player_name'].map(avg_db).where(is_total).round(2)
+
+    return summary.sort_values(['player_name', 'role_id'], ignore_index=True)
+
+
+def index_player_summary(summary):
+    """{игрок: (итоговая строка, строки по ролям)} для чтения одним обращением."""
+    blocks = {}
+    for player, block in summary.groupby('player_name', sort=False):
+        is_total = block['role_id'] == ALL_ROLES
+        blocks[player] = (block[is_total].iloc[0], block[~is_total].reset_index(drop=True))
+    return blocks
+
+
+def build_box_summary(df_games, df_firstshots):
+    """
+    Игры, победы и первые отстрелы по (player_name, role_id, boxNumber) -
+    длинная таблица для BoxCube.
+    """
+    keys = ['player_name', 'role_id', 'boxNumber']
+    games = df_games.groupby(keys, observed=True).agg(
+        games=('who_win', 'count'),
+        wins=('win_condition', 'sum'),
+    )
+
+    # Игры без первого отстрела (пустые бокс и роль) в счёт не идут
+    shots = df_firstshots[keys].dropna().astype({'role_id': 'int64', 'boxNumber': 'int64'})
+    shots = shots.groupby(keys, observed=True).size().rename('shots')
+
+    summary = games.join(shots, how='outer').fillna(0).astype('int64')
+    return summary.reset_index()
+
+
+class BoxCube:
+    """
+    Куб игры/победы/первые отстрелы с осями (игрок, роль, бокс).
+
+    Последний срез по оси игроков - сумма по всем игрокам, поэтому общий вид
+    и вид игрока считаются одинаково: выбор среза и сумма по набору ролей.
+    """
+
+    MEASURES = ['games', 'wins', 'shots']
+
+    def __init__(self, box_summary, boxes=None):
+        """
+        :param box_summary: Таблица из build_box_summary.
+        :param boxes: Номера боксов; по умолчанию 1..N, где N - наибольший бокс в данных.
+        """
+        if boxes is None:
+            boxes = range(1, int(box_summary['boxNumber'].max()) + 1) if len(box_summary) else []
+        summary = box_summary[box_summary['role_id'].isin(ROLES) & box_summary['boxNumber'].isin(boxes)]
+
+        players = sorted(box_summary['player_name'].unique())
+        self.boxes = np.asarray(boxes, dtype='int64')
+        self._players = {name: i for i, name in enumerate(players)}
+        self._roles = {role: i for i, role in enumerate(ROLES)}
+        box_pos = {box: i for i, box in enumerate(boxes)}
+
+        # (мера, игрок + все игроки, роль, бокс)
+        self.values = np.zeros((len(self.MEASURES), len(players) + 1, len(ROLES), len(boxes)), dtype='int64')
+        index = (summary['player_name'].map(self._players).to_numpy(),
+                 summary['role_id'].map(self._roles).to_numpy(),
+                 summary['boxNumber'].map(box_pos).to_numpy())
+        for i, measure in enumerate(self.MEASURES):
+            self.values[i][index] = summary[measure].to_numpy()
+        self.values[:, -1] = self.values[:, :-1].sum(axis=1)
+
+    def totals(self, player=None, roles=ROLES):
+        """
+        Суммы мер по боксам для игрока (None - все игроки) и набора ролей.
+
+        :return: Массив (мера, бокс); для неизвестного игрока - нули.
+        """
+        role_index = [self._roles[role] for role in roles if role in self._roles]
+        if player is None:
+            block = self.values[:, -1]
+        elif player in self._players:
+            block = self.values[:, self._players[player]]
+        else:
+            return np.zeros((len(self.MEASURES), len(self.boxes)), dtype='int64')
+        return block[:, role_index].sum(axis=1)
+
+    def box_stats(self, player=None, roles=ROLES):
+        """Таблица для prep.create_circular_layout: по строке на бокс."""
+        games, wins, shots = self.totals(player, roles)
+
+        win_rate = np.zeros(len(games))
+        played = games > 0
+        win_rate[played] = (wins[played] / games[played] * 100).round(1)
+
+        return pd.DataFrame({
+            'boxNumber': self.boxes,
+            'total_games': games,
+            'total_wins': wins,
+            'win_rate': win_rate,
+            'shots': shots,
+            'win_rate_num': win_rate,
+        })
+
+
+def build_firstshot_summary(df_games, df_firstshots):
+    """
+    Сводка первых отстрелов: по строке на отстрелянного игрока (по имени) и
+    строка ALL_PLAYERS в конце.
+
+    shots - количество первых отстрелов, maf_0..maf_3 - их распределение по
+    maf_in_best; в строке ALL_PLAYERS также misses - игры df_games без
+    отстрелянного игрока. Отстрелы по боксам и ролям - мера shots в box_summary.
+    """
+    shots = df_firstshots.dropna(subset=['player_name', 'maf_in_best'])
+    maf_in_best = shots['maf_in_best'].astype(int)
+    maf_columns = [f'maf_{value}' for value in MAF_IN_BEST]
+
+    players = shots.groupby('player_name', observed=True)['game_id'].count().rename('shots').to_frame()
+    distribution = maf_in_best.groupby([shots['player_name'], maf_in_best], observed=True).size().unstack(fill_value=0)
+    players = players.join(distribution.reindex(columns=MAF_IN_BEST, fill_value=0).set_axis(maf_columns, axis=1))
+    players = players.reset_index().astype({'player_name': object})
+    players['misses'] = 0
+
+    totals = {'player_name': ALL_PLAYERS, 'shots': len(shots),
+              'misses': df_games['game_id'].nunique() - shots['game_id'].nunique()}
+    totals.update(zip(maf_columns, maf_in_best.value_counts().reindex(MAF_IN_BEST, fill_value=0).tolist()))
+
+    summary = pd.concat([players, pd.DataFrame([totals])], ignore_index=True)
+    return summary[['player_name', 'shots', *maf_columns, 'misses']].astype({column: 'int64' for column in
+                                                                              ['shots', *maf_columns, 'misses']})
+
+
+def index_firstshot_summary(summary):
+    """{игрок: строка сводки отстрелов}."""
+    return {row['player_name']: row for _, row in summary.iterrows()}
+
+
+def shot_distribution(row=None):
+    """Количество отстрелов по maf_in_best из строки сводки (None - нули)."""
+    if row is None:
+        return pd.Series(0, index=MAF_IN_BEST)
+    return pd.Series([row[f'maf_{value}'] for value in MAF_IN_BEST], index=MAF_IN_BEST)
+
+
+def most_shot(summary, players=None, ascending=False):
+    """
+    Игрок с наибольшим (ascending=True - с наименьшим) числом первых
+    отстрелов среди players (None - среди всех).
+    """
+    rows = summary[summary['player_name'] != ALL_PLAYERS]
+    if players is not None:
+        rows = rows[rows['player_name'].isin(players)]
+    return rows.sort_values('shots', ascending=ascending).head(1)['player_name'].values[0]
+
+
+def build_summaries(dataset):
+    """
+    Все сводные таблицы для набора данных из prep.build_dataset.
+
+    :return: Словарь {имя таблицы: DataFrame}, дополняющий dataset.
+    """
+    return {
+        'player_summary': build_player_summary(dataset['df_games'], dataset['series_results']),
+        'box_summary': build_box_summary(dataset['df_games'], dataset['df_firstshots']),
+        'firstshot_summary': build_firstshot_summary(dataset['df_games'], dataset['df_firstshots']),
+    }